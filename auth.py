@@ -1,56 +1,68 @@
+import asyncio
+import os
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
-import bcrypt
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import User
-from database import SessionLocal
+from database import get_db
+from passwords import password_pool, hash_password, verify_password_hash, needs_rehash
+from user_cache import user_cache, token_versions, invalidate_user
+from token_cache import access_token_cache
+from revocation import revocation_store, family_key, legacy_token_key
+from denylist import access_denylist
+from keys import key_ring, ACCESS_TOKEN_ALGORITHM
 
 # Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production"
 REFRESH_SECRET_KEY = "your-refresh-secret-key-change-this"  # Different key for refresh tokens
-ALGORITHM = "HS256"
+ALGORITHM = "HS256"  # Refresh tokens; access tokens use ACCESS_TOKEN_ALGORITHM (keys.py)
 ACCESS_TOKEN_EXPIRE_MINUTES = 15  # Shorter access token
 REFRESH_TOKEN_EXPIRE_DAYS = 7     # Longer refresh token
+# Opt-in: embed is_active/is_admin and the user's token version in tokens so
+# get_current_active_user can authorize without loading the user row
+SELF_CONTAINED_ACCESS_TOKENS = os.getenv("SELF_CONTAINED_ACCESS_TOKENS", "false").lower() in ("1", "true", "yes")
 
 # OAuth2 schemes
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def truncate_to_72_bytes(password: str) -> bytes:
-    """Truncate password to exactly 72 bytes for bcrypt"""
-    encoded = password.encode('utf-8')
-    if len(encoded) > 72:
-        return encoded[:72]
-    return encoded
-
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a bcrypt hash"""
+    """Verify a password against a stored hash of any supported scheme"""
     try:
-        if isinstance(hashed_password, str):
-            hashed_password_bytes = hashed_password.encode('utf-8')
-        else:
-            hashed_password_bytes = hashed_password
-            
-        truncated_password = truncate_to_72_bytes(plain_password)
-        return bcrypt.checkpw(truncated_password, hashed_password_bytes)
+        if isinstance(hashed_password, bytes):
+            hashed_password = hashed_password.decode('utf-8')
+        return verify_password_hash(plain_password, hashed_password)
     except Exception:
         return False
 
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
-    truncated_password = truncate_to_72_bytes(password)
-    salt = bcrypt.gensalt(rounds=12)
-    hashed = bcrypt.hashpw(truncated_password, salt)
-    return hashed.decode('utf-8')
+    """Hash a password with the current hashing policy"""
+    return hash_password(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool instead of the event loop"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool instead of the event loop"""
+    return await password_pool.run(get_password_hash, password)
+
+def token_claims(user: User) -> dict:
+    """Claims for a user's tokens; includes authorization claims when self-contained tokens are on"""
+    claims = {"sub": user.username}
+    if SELF_CONTAINED_ACCESS_TOKENS:
+        claims.update({
+            "uid": user.id,
+            "active": bool(user.is_active),
+            "admin": bool(user.is_admin),
+            "ver": user.token_version or 0,
+        })
+    return claims
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -60,7 +72,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    # jti lets a single token be denied at logout
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
+    if key_ring.enabled:
+        kid, private_key = key_ring.signing_key()
+        return jwt.encode(to_encode, private_key, algorithm=ACCESS_TOKEN_ALGORITHM, headers={"kid": kid})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -72,56 +88,97 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # jti identifies this token for rotation; fam ties the rotated chain together
+    to_encode.setdefault("fam", uuid.uuid4().hex)
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Authenticate a user"""
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, username)
     if not user:
+        # Answer as slowly as a wrong password would, without spending CPU on a dummy hash
+        await asyncio.sleep(password_pool.typical_run_seconds())
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
+    # Move the stored hash onto the current policy while the password is at hand
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(password)
+        await invalidate_user(db, user.username)
     return user
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from access token"""
-    credentials_exception = HTTPException(
+def decode_access_token(token: str) -> dict:
+    """Verify an access token with the public key named by its kid, or the shared secret"""
+    if not key_ring.enabled:
+        # Decode with access token secret
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    public_key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid", ""))
+    if public_key is None:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, public_key, algorithms=[ACCESS_TOKEN_ALGORITHM])
+
+def credentials_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+async def get_access_token_payload(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> dict:
+    """Verified, non-revoked payload of the bearer access token"""
     try:
-        # Decode with access token secret
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Tokens verified earlier skip the HMAC check and JSON parsing
+        payload = access_token_cache.get(token)
+        if payload is None:
+            payload = decode_access_token(token)
+            access_token_cache.set(token, payload)
         username: str = payload.get("sub")
         token_type: str = payload.get("type")
         
         if username is None or token_type != "access":
-            raise credentials_exception
+            raise credentials_error()
     except JWTError:
-        raise credentials_exception
-    
-    user = get_user_by_username(db, username)
-    if user is None:
-        raise credentials_exception
-    
-    return user
+        raise credentials_error()
+
+    # The Bloom filter clears almost every token without a query
+    jti = payload.get("jti")
+    if jti and await access_denylist.is_revoked(db, jti, payload["exp"]):
+        raise credentials_error()
+    return payload
 
-async def get_current_user_from_refresh_token(
-    token: str,
-    db: Session = Depends(get_db)
+async def get_current_user(
+    payload: dict = Depends(get_access_token_payload),
+    db: AsyncSession = Depends(get_db)
 ) -> User:
-    """Get user from refresh token (for token refresh endpoint)"""
+    """Get current authenticated user from access token"""
+    username = payload["sub"]
+    cached = user_cache.get(username)
+    if cached is not None:
+        # Attach the snapshot to this request's session without querying
+        user = await db.merge(cached, load=False)
+    else:
+        user = await get_user_by_username(db, username)
+        if user is None:
+            raise credentials_error()
+        user_cache.set(username, user)
+
+    token_versions.set(username, user.token_version or 0)
+    if "ver" in payload and payload["ver"] != (user.token_version or 0):
+        raise credentials_error()
+    return user
+
+def decode_refresh_token(token: str) -> dict:
+    """Verified payload of a refresh token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate refresh token",
@@ -137,24 +194,96 @@ async def get_current_user_from_refresh_token(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return payload
+
+async def rotate_refresh_token(token: str, db: AsyncSession) -> Tuple[User, str]:
+    """Spend a refresh token, returning its user and token family
+
+    Each refresh token can be used once. Presenting one that was already
+    used means it leaked, so its whole family is revoked.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate refresh token",
+    )
+    payload = decode_refresh_token(token)
+    family = payload.get("fam")
+    jti = payload.get("jti")
+
+    if family and revocation_store.is_revoked(family_key(family)):
+        raise credentials_exception
+    # Tokens issued before rotation existed carry no jti; they are spent by digest
+    # and start a new family
+    spent_key = jti or legacy_token_key(token)
+    if not await revocation_store.revoke(db, spent_key, datetime.utcfromtimestamp(payload["exp"])):
+        revocation_store.reuse_detected += 1
+        if family:
+            await revocation_store.revoke(
+                db, family_key(family), datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+            )
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token reuse detected; please log in again",
+        )
     
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, payload["sub"])
     if user is None:
         raise credentials_exception
+    if "ver" in payload and payload["ver"] != (user.token_version or 0):
+        raise credentials_exception
     
-    return user
+    return user, family or uuid.uuid4().hex
+
+async def revoke_refresh_token(token: str, username: str, db: AsyncSession):
+    """Revoke the family of a refresh token belonging to username (logout)"""
+    payload = decode_refresh_token(token)
+    if payload["sub"] != username or not payload.get("fam"):
+        raise HTTPException(status_code=400, detail="Refresh token does not belong to this session")
+    await revocation_store.revoke(
+        db, family_key(payload["fam"]), datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
 
 async def get_current_active_user(
+    payload: dict = Depends(get_access_token_payload),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Ensure user is active
+
+    With self-contained tokens the check uses the token's claims and the known
+    token version, and the returned User carries only those claims. Routes that
+    read or change the full record should use get_current_active_user_record.
+    """
+    if SELF_CONTAINED_ACCESS_TOKENS and "ver" in payload:
+        current_version = token_versions.get(payload["sub"])
+        if current_version is not None:
+            if payload["ver"] != current_version:
+                raise credentials_error()
+            if not payload["active"]:
+                raise HTTPException(status_code=400, detail="Inactive user")
+            return User(
+                id=payload["uid"],
+                username=payload["sub"],
+                is_active=payload["active"],
+                is_admin=payload["admin"],
+                token_version=payload["ver"],
+            )
+
+    current_user = await get_current_user(payload, db)
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+async def get_current_active_user_record(
     current_user: User = Depends(get_current_user)
 ) -> User:
-    """Ensure user is active"""
+    """Ensure user is active, always returning the full user row"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 def create_admin_user(db: Session):
-    """Create default admin user if it doesn't exist"""
-    admin = get_user_by_username(db, "admin")
+    """Create default admin user if it doesn't exist (runs on the sync startup session)"""
+    admin = db.query(User).filter(User.username == "admin").first()
     if not admin:
         admin = User(
             username="admin",
@@ -0,0 +1,141 @@
+"""Concurrent-request throughput: blocking Session vs AsyncSession in async handlers
+
+Builds a throwaway SQLite database, then serves the same scan-heavy query from
+two apps: one running a sync Session inside `async def` (the old pattern) and one
+using AsyncSession on aiosqlite. While the queries run, a cheap ping endpoint is
+hit to show how long other requests wait on the event loop.
+
+Both engines get a pool as large as the concurrency: with the default pool, the
+blocking version can exhaust it and then wait for a connection on the event loop
+itself, which deadlocks until the pool timeout.
+
+    python benchmarks/async_db.py [--rows 20000] [--requests 200] [--concurrency 10]
+
+Needs httpx, which the API itself does not use: `pip install httpx`.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+QUERY = text("SELECT count(*) FROM news WHERE content LIKE '%needle%'")
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE news (id INTEGER PRIMARY KEY, title TEXT, content TEXT)"))
+        conn.execute(
+            text("INSERT INTO news (title, content) VALUES (:title, :content)"),
+            [{"title": f"Article {i}", "content": "lorem ipsum " * 90} for i in range(rows)],
+        )
+    engine.dispose()
+
+
+def sync_app(path: str, pool_size: int) -> FastAPI:
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=pool_size, max_overflow=0
+    )
+    SessionLocal = sessionmaker(bind=engine)
+    app = FastAPI()
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/scan")
+    async def scan(db: Session = Depends(get_db)):
+        return {"count": db.execute(QUERY).scalar()}
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    return app
+
+
+def async_app(path: str, pool_size: int) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=pool_size, max_overflow=0)
+    SessionLocal = async_sessionmaker(bind=engine)
+    app = FastAPI()
+
+    async def get_db():
+        async with SessionLocal() as db:
+            yield db
+
+    @app.get("/scan")
+    async def scan(db: AsyncSession = Depends(get_db)):
+        return {"count": (await db.execute(QUERY)).scalar()}
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/scan")  # warm up connections
+        semaphore = asyncio.Semaphore(concurrency)
+        ping_latencies = []
+        done = asyncio.Event()
+
+        async def scan_once():
+            async with semaphore:
+                await client.get("/scan")
+
+        async def pinger():
+            # Latency includes the 5 ms sleep overrunning while the loop is blocked
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                await client.get("/ping")
+                ping_latencies.append((time.perf_counter() - started) * 1000 - 5)
+
+        ping_task = asyncio.create_task(pinger())
+        started = time.perf_counter()
+        await asyncio.gather(*(scan_once() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    ping_latencies.sort()
+    return {
+        "req_per_s": requests / elapsed,
+        "ping_p50_ms": statistics.median(ping_latencies),
+        "ping_p99_ms": ping_latencies[int(len(ping_latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.rows)
+        for name, factory in (("sync Session (before)", sync_app), ("AsyncSession (after)", async_app)):
+            result = asyncio.run(run(factory(path, args.concurrency), args.requests, args.concurrency))
+            print(
+                f"{name:24} {result['req_per_s']:8.1f} req/s   "
+                f"ping p50 {result['ping_p50_ms']:7.2f} ms   p99 {result['ping_p99_ms']:7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
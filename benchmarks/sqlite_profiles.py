@@ -0,0 +1,106 @@
+"""Mixed read/write throughput for each SQLite connection profile in database.py
+
+Seeds a throwaway database, then for a fixed time runs reader threads (a page
+of the newest news) next to writer threads (one contact insert per commit),
+each on its own pooled connection, once per profile.
+
+    python benchmarks/sqlite_profiles.py [--rows 20000] [--seconds 5] [--readers 8] [--writers 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from database import SQLITE_PROFILES, apply_sqlite_profile  # noqa: E402
+
+READ = text("SELECT id, title, created_at FROM news ORDER BY created_at DESC, id DESC LIMIT 20 OFFSET :offset")
+WRITE = text("INSERT INTO contacts (name, email, message) VALUES (:name, :email, :message)")
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE news (id INTEGER PRIMARY KEY, title TEXT, content TEXT, created_at TIMESTAMP)"
+        ))
+        conn.execute(text("CREATE INDEX ix_news_created_at_id ON news (created_at, id)"))
+        conn.execute(text("CREATE TABLE contacts (id INTEGER PRIMARY KEY, name TEXT, email TEXT, message TEXT)"))
+        conn.execute(
+            text("INSERT INTO news (title, content, created_at) VALUES (:title, :content, datetime('now', :age))"),
+            [{"title": f"Article {i}", "content": "lorem ipsum " * 90, "age": f"-{i} minutes"} for i in range(rows)],
+        )
+    engine.dispose()
+
+
+def run(path: str, profile: str, seconds: float, readers: int, writers: int) -> dict:
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False},
+        pool_size=readers + writers, max_overflow=0,
+    )
+    apply_sqlite_profile(engine, profile)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader(n: int):
+        done = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < deadline:
+                conn.execute(READ, {"offset": (done * 20 + n) % 1000}).fetchall()
+                conn.rollback()  # end the read transaction like a request would
+                done += 1
+        with lock:
+            counts["reads"] += done
+
+    def writer(n: int):
+        done = errors = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < deadline:
+                try:
+                    conn.execute(WRITE, {"name": f"w{n}", "email": "bench@example.com", "message": "hello " * 20})
+                    conn.commit()
+                    done += 1
+                except OperationalError:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return {name: value / seconds if name != "errors" else value for name, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    for profile in SQLITE_PROFILES:
+        # A fresh file per profile: journal_mode=WAL persists in the database file
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            seed(path, args.rows)
+            result = run(path, profile, args.seconds, args.readers, args.writers)
+        print(
+            f"{profile:12} {result['reads']:9.1f} reads/s   {result['writes']:8.1f} writes/s   "
+            f"{result['errors']} locked errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+from database import Base, engine, SessionLocal, upgrade_schema
+from search import create_search_index
+from news_fields import backfill_news_excerpts, backfill_news_updated_at
+from revocation import revocation_store
+from denylist import access_denylist
+from keys import key_ring
+from passwords import configure_password_policy
+from auth import create_admin_user
+from upload_storage import UPLOAD_DIR
+
+# Run init_database() in every worker's startup. Turn off when a deploy step
+# runs `python bootstrap.py` once instead, so workers start without schema work.
+BOOTSTRAP_ON_STARTUP = os.getenv("BOOTSTRAP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def init_database():
+    """Create and upgrade the schema, the search index and the admin user"""
+    Base.metadata.create_all(bind=engine)
+    added_columns = upgrade_schema(engine)
+    create_search_index(engine)
+
+    db = SessionLocal()
+    try:
+        # Create admin user automatically
+        create_admin_user(db)
+        if "news.updated_at" in added_columns:
+            backfill_news_updated_at(db)
+        if "news.excerpt" in added_columns:
+            backfill_news_excerpts(db)
+    finally:
+        db.close()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+def load_process_state():
+    """Fill this process's in-memory revocation, denylist and key state"""
+    db = SessionLocal()
+    try:
+        revocation_store.load(db)
+        access_denylist.load(db)
+    finally:
+        db.close()
+    key_ring.load()
+
+
+if __name__ == "__main__":
+    # python bootstrap.py  (once per deploy, before starting workers)
+    if sys.argv[1:]:
+        sys.exit("usage: python bootstrap.py")
+    # Pick (and optionally calibrate) the password hashing policy before any hashing
+    configure_password_policy()
+    init_database()
+    print("✅ Database ready")
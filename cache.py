@@ -0,0 +1,257 @@
+import calendar
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from invalidation import publish_invalidation, register_invalidation_handler
+from metrics import register_metrics
+from models import ContentVersion
+
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32 MiB of serialized bodies
+# Safety net: entries expire even if an invalidation from another process is missed
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+NEWS_LIST_TAG = "news:list"
+
+
+def news_tag(news_id: int) -> str:
+    """Invalidation tag for a single article"""
+    return f"news:{news_id}"
+
+
+class ResponseCache:
+    """Bounded LRU of serialized response bodies, invalidated by tag
+
+    Each worker keeps its own copy. Writes in any process reach the others
+    through the invalidation log (see invalidate_news), and entries expire
+    after `ttl` seconds regardless.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[bytes, Dict[str, str], float]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every invalidation; read it before building a body to cache"""
+        return self._generation
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Return (body, headers) for a cached response, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(
+        self,
+        key: str,
+        body: bytes,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """Store a body and its headers, unless an invalidation happened since `generation` was read"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, headers or {}, time.monotonic() + self.ttl)
+            self._bytes += len(body)
+            key_tags = set(tags)
+            self._key_tags[key] = key_tags
+            for tag in key_tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying any of the given tags"""
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        body, _, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+register_metrics("response_cache", response_cache.stats)
+
+
+class ContentVersions:
+    """Per-tag versions used to build strong ETags, stored in content_versions
+
+    Versions live in the database so every worker derives the same ETag for
+    the same data. Each process keeps the rows it has read until a write (its
+    own or one published by another process) drops them, or the TTL expires.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._cached: Dict[str, Tuple[int, Optional[datetime], float]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    async def get(self, db: AsyncSession, tag: str) -> Tuple[int, Optional[datetime]]:
+        """(version, modified_at) for tag; (0, None) before its first write"""
+        entry = self._cached.get(tag)
+        if entry is not None and entry[2] >= time.monotonic():
+            return entry[0], entry[1]
+        generation = self._generation
+        row = await db.get(ContentVersion, tag)
+        version, modified_at = (row.version, row.modified_at) if row is not None else (0, None)
+        with self._lock:
+            # Unless a write was seen while reading, which may have made the row stale
+            if generation == self._generation:
+                self._cached[tag] = (version, modified_at, time.monotonic() + self.ttl)
+        return version, modified_at
+
+    async def etag(self, db: AsyncSession, tag: str) -> str:
+        version, modified_at = await self.get(db, tag)
+        # The timestamp keeps tags from a recreated database from matching old ones
+        stamp = calendar.timegm(modified_at.utctimetuple()) if modified_at else 0
+        return f'"{tag}-{version}-{stamp}"'
+
+    async def bump(self, db: AsyncSession, *tags: str):
+        """Increment versions in db's transaction (an atomic upsert, safe across processes)"""
+        dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+        now = datetime.utcnow()
+        for tag in tags:
+            statement = dialect.insert(ContentVersion).values(tag=tag, version=1, modified_at=now)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[ContentVersion.tag],
+                set_={"version": ContentVersion.version + 1, "modified_at": now},
+            ))
+
+    def forget(self, *tags: str):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._cached.pop(tag, None)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an ETag (weak comparison, per RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date"""
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: Optional[str]) -> bool:
+    """Evaluate If-Modified-Since against a Last-Modified header value (second precision)"""
+    if not if_modified_since or not last_modified:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(last_modified) <= since
+
+
+news_versions = ContentVersions()
+
+
+def _news_tags(news_id: Optional[int]) -> list:
+    return [NEWS_LIST_TAG] if news_id is None else [NEWS_LIST_TAG, news_tag(news_id)]
+
+
+def evict_news(news_id: Optional[int] = None):
+    """Drop this process's cached bodies and ETag versions after a news write"""
+    tags = _news_tags(news_id)
+    news_versions.forget(*tags)
+    response_cache.invalidate(*tags)
+
+
+async def invalidate_news(db: AsyncSession, news_id: Optional[int] = None):
+    """Commit a news write together with its invalidation, then evict here
+
+    Other worker processes evict when they read the published key.
+    """
+    await news_versions.bump(db, *_news_tags(news_id))
+    publish_invalidation(db, news_tag(news_id) if news_id is not None else NEWS_LIST_TAG)
+    await db.commit()
+    evict_news(news_id)
+
+
+def _apply_published(value: str):
+    evict_news(None if value == "list" else int(value))
+
+
+register_invalidation_handler("news", _apply_published)
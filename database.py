@@ -1,9 +1,121 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./news.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def normalize_database_url(url: str) -> str:
+    """Use the psycopg (3) driver for PostgreSQL URLs, including Heroku/Render-style postgres://"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def async_database_url(url: str) -> str:
+    """Async driver URL for the same database (psycopg serves both; SQLite needs aiosqlite)"""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL", "sqlite:///./news.db"))
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Connections per process: pool_size kept open, up to max_overflow more under load.
+# With N workers on M nodes the server must allow N * M * (size + overflow).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Reconnect before a load balancer or the server drops idle connections (seconds, -1 never)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test each connection on checkout so a restarted database doesn't fail the next request
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+# PRAGMAs run on every new SQLite connection, by profile (SQLITE_PROFILE)
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, full fsync on every commit
+    "default": {},
+    # WAL lets readers run alongside a writer; NORMAL only fsyncs at checkpoints,
+    # which stays consistent after a crash and can lose at most the last commits
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative means KiB: 64 MiB of page cache
+        "busy_timeout": 5000,  # ms to wait for a lock instead of failing with "database is locked"
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+
+
+def apply_sqlite_profile(engine, profile: str = SQLITE_PROFILE):
+    """Run the profile's PRAGMAs on each connection the engine opens"""
+    pragmas = SQLITE_PROFILES[profile]
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# Sync engine for startup work (schema, bootstrap); requests use the async engine
+engine = create_engine(
+    DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {}, **POOL_OPTIONS
+)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
-Base = declarative_base()
\ No newline at end of file
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+apply_sqlite_profile(engine)
+apply_sqlite_profile(async_engine.sync_engine)
+# Objects stay usable after commit instead of lazy-loading outside the event loop
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_db():
+    """Request-scoped session shared by every dependency that asks for it
+
+    FastAPI caches a dependency for the duration of a request, so the auth
+    dependencies and the handler get the same session. It only checks out a
+    connection when the first query runs.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+Base = declarative_base()
+
+def upgrade_schema(bind=engine):
+    """Add columns and indexes introduced in the models after their tables already existed
+
+    Returns the "table.column" names that were added so callers can backfill them.
+    """
+    inspector = inspect(bind)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        with bind.begin() as conn:
+            for column in table.columns:
+                if column.name not in columns:
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                    if column.server_default is not None:
+                        ddl += f" DEFAULT {column.server_default.arg}"
+                    conn.execute(text(ddl))
+                    added.append(f"{table.name}.{column.name}")
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+    return added
@@ -0,0 +1,149 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from invalidation import publish_invalidation, register_invalidation_handler
+from metrics import register_metrics
+from models import RevokedToken
+
+# Revocations expected per bucket, and the false-positive rate at that load
+DENYLIST_BUCKET_CAPACITY = 100_000
+DENYLIST_FALSE_POSITIVE_RATE = 0.001
+# Tokens are grouped by expiry; a whole bucket is dropped once its tokens have expired
+DENYLIST_BUCKET_SECONDS = 15 * 60
+
+
+def access_key(jti: str) -> str:
+    return f"acc:{jti}"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one BLAKE2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class AccessTokenDenylist:
+    """Revoked access tokens: Bloom filters in memory, exact rows in revoked_tokens
+
+    Most tokens were never revoked, and the filter answers that without touching
+    the database. Only a "maybe" goes on to the exact lookup.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DENYLIST_BUCKET_CAPACITY,
+        error_rate: float = DENYLIST_FALSE_POSITIVE_RATE,
+        bucket_seconds: int = DENYLIST_BUCKET_SECONDS,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bucket_seconds = bucket_seconds
+        self._buckets: Dict[int, BloomFilter] = {}
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.maybe = 0
+        self.false_positives = 0
+
+    def _bucket(self, expires_at: float) -> int:
+        return int(expires_at // self.bucket_seconds)
+
+    def add(self, jti: str, expires_at: float):
+        """Add a revoked token to the filter for its expiry bucket"""
+        bucket = self._bucket(expires_at)
+        with self._lock:
+            self._expire_buckets()
+            bloom = self._buckets.get(bucket)
+            if bloom is None:
+                bloom = self._buckets[bucket] = BloomFilter(self.capacity, self.error_rate)
+            bloom.add(jti)
+
+    def might_be_revoked(self, jti: str, expires_at: float) -> bool:
+        self.checks += 1
+        bloom = self._buckets.get(self._bucket(expires_at))
+        if bloom is None or jti not in bloom:
+            return False
+        self.maybe += 1
+        return True
+
+    async def is_revoked(self, db: AsyncSession, jti: str, expires_at: float) -> bool:
+        """Bloom check, then an exact lookup only when the filter says maybe"""
+        if not self.might_be_revoked(jti, expires_at):
+            return False
+        revoked = await db.get(RevokedToken, access_key(jti)) is not None
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    async def revoke(self, db: AsyncSession, jti: str, expires_at: float):
+        """Deny an access token until it expires, here and in other processes"""
+        self.add(jti, expires_at)
+        if await db.get(RevokedToken, access_key(jti)) is None:
+            db.add(RevokedToken(jti=access_key(jti), expires_at=datetime.utcfromtimestamp(expires_at)))
+        publish_invalidation(db, f"denied:{expires_at:.0f}:{jti}")
+        await db.commit()
+
+    def load(self, db: Session):
+        """Fill the filters from unexpired revocations at startup"""
+        rows = db.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.jti.like("acc:%"), RevokedToken.expires_at > datetime.utcnow())
+        )
+        for key, expires_at in rows:
+            self.add(key[len("acc:"):], (expires_at - datetime(1970, 1, 1)).total_seconds())
+
+    def prune(self):
+        """Drop buckets whose tokens have all expired"""
+        with self._lock:
+            self._expire_buckets()
+
+    def _expire_buckets(self):
+        current = self._bucket(time.time())
+        for bucket in [bucket for bucket in self._buckets if bucket < current]:
+            del self._buckets[bucket]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "entries": sum(bloom.count for bloom in self._buckets.values()),
+                "bytes": sum(len(bloom.bits) for bloom in self._buckets.values()),
+                "checks": self.checks,
+                "maybe": self.maybe,
+                "false_positives": self.false_positives,
+            }
+
+
+access_denylist = AccessTokenDenylist()
+register_metrics("access_token_denylist", access_denylist.stats)
+
+
+def _apply_published(value: str):
+    expires_at, _, jti = value.partition(":")
+    access_denylist.add(jti, float(expires_at))
+
+
+register_invalidation_handler("denied", _apply_published)
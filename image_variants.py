@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from sqlalchemy import update
+from database import AsyncSessionLocal
+from metrics import register_metrics
+from models import News
+from cache import invalidate_news
+from upload_storage import UPLOAD_DIR, NEGOTIATED_FORMATS, digest_from_url, variant_path
+
+# Widths generated for every uploaded image that is wider; the image's own
+# width (up to the largest of these) is always generated too
+IMAGE_VARIANT_WIDTHS = tuple(
+    sorted(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1024,1600").split(","))
+)
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Jobs allowed to wait for a worker; later uploads wait their turn in the event loop
+IMAGE_VARIANT_MAX_QUEUE = 16
+ENCODER_OPTIONS = {
+    ".avif": {"format": "AVIF", "quality": 60},
+    ".webp": {"format": "WEBP", "quality": 78, "method": 4},
+    ".jpg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+    ".png": {"format": "PNG", "optimize": True},
+}
+SOURCE_EXTENSIONS = (".jpg", ".png", ".webp")  # GIFs are left alone (animation)
+
+def _save_atomically(image, path: str, ext: str):
+    fd, temp_path = tempfile.mkstemp(".part", ".variant-", os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, **ENCODER_OPTIONS[ext])
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def generate_variants(source: str, directory: str, digest: str, widths: Tuple[int, ...]) -> List[Tuple[int, str]]:
+    """Resize source to each width in every format (runs in a worker process)
+
+    Returns (width, fallback extension) pairs. Files that already exist are
+    kept, so the same image uploaded for another article costs nothing.
+    """
+    from PIL import Image, ImageOps, features
+
+    with Image.open(source) as opened:
+        image = ImageOps.exif_transpose(opened)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    fallback = ".png" if has_alpha else ".jpg"
+    # The fallback (JPEG, or PNG with transparency) is the URL listed in the srcset
+    extensions = [ext for mime, ext in NEGOTIATED_FORMATS if features.check(ext[1:])] + [fallback]
+    targets = sorted({width for width in widths if width < image.width} | {min(image.width, widths[-1])})
+    generated = []
+    for width in targets:
+        resized = None
+        for ext in extensions:
+            path = variant_path(directory, digest, width, ext)
+            if os.path.exists(path):
+                continue
+            if resized is None:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            _save_atomically(resized, path, ext)
+        generated.append((width, fallback))
+    return generated
+
+
+def build_srcset(directory: str, digest: str, variants: List[Tuple[int, str]]) -> str:
+    """srcset attribute value listing each width's fallback URL"""
+    return ", ".join(
+        f"/{directory}/{digest[:2]}/{digest}-{width}w{ext} {width}w" for width, ext in variants
+    )
+
+
+class ImageVariantPool:
+    """Bounded process pool that renders image variants after the response is sent"""
+
+    def __init__(self, workers: int = IMAGE_VARIANT_WORKERS, max_queue: int = IMAGE_VARIANT_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use, so importing the app does not spawn processes. Workers
+        # come from a fork server rather than forking this threaded process.
+        with self._lock:
+            if self._executor is None:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+            return self._executor
+
+    async def run(self, *args) -> List[Tuple[int, str]]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.max_queue)
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), generate_variants, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+image_variant_pool = ImageVariantPool()
+register_metrics("image_variants", image_variant_pool.stats)
+
+
+async def build_news_image_variants(news_id: int, image_url: str):
+    """Background task: render variants of an article's image and record their srcset"""
+    digest = digest_from_url(image_url)
+    if digest is None or os.path.splitext(image_url)[1] not in SOURCE_EXTENSIONS:
+        return
+    source = os.path.join(UPLOAD_DIR, image_url[len(f"/{UPLOAD_DIR}/"):])
+    try:
+        variants = await image_variant_pool.run(source, UPLOAD_DIR, digest, IMAGE_VARIANT_WIDTHS)
+    except Exception as exc:
+        image_variant_pool.failed += 1
+        print(f"⚠️  Image variants failed for {image_url}: {exc}")
+        return
+    image_variant_pool.completed += 1
+
+    async with AsyncSessionLocal() as db:
+        # Only if the article still shows this image
+        await db.execute(
+            update(News)
+            .where(News.id == news_id, News.image_url == image_url)
+            .values(image_srcset=build_srcset(UPLOAD_DIR, digest, variants))
+        )
+        await invalidate_news(db, news_id)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import CacheInvalidation
+
+# How often each process reads invalidations published by the others
+INVALIDATION_POLL_SECONDS = 1.0
+INVALIDATION_RETENTION = timedelta(hours=1)
+# Ids come from a sequence, and on PostgreSQL a transaction can commit after one
+# holding a later id. Rows this recent are re-read until they can no longer be
+# missed; ids already applied are skipped.
+INVALIDATION_LOOKBACK = timedelta(seconds=10)
+
+# key prefix (before the first ":") -> handler called with the rest of the key
+_handlers: Dict[str, Callable[[str], None]] = {}
+
+
+def register_invalidation_handler(prefix: str, handler: Callable[[str], None]):
+    """Call handler(value) for every published key of the form "<prefix>:<value>\""""
+    _handlers[prefix] = handler
+
+
+def publish_invalidation(db: AsyncSession, key: str):
+    """Queue a key for other processes; it is published when the session commits"""
+    db.add(CacheInvalidation(key=key))
+
+
+def _dispatch(key: str):
+    prefix, _, value = key.partition(":")
+    handler = _handlers.get(prefix)
+    if handler is not None:
+        handler(value)
+
+
+async def poll_invalidations(interval: float = INVALIDATION_POLL_SECONDS):
+    """Background task applying invalidations published by any process"""
+    async with AsyncSessionLocal() as db:
+        last_seen = (await db.execute(select(func.max(CacheInvalidation.id)))).scalar() or 0
+    # id -> created_at of rows applied within the lookback window
+    applied: Dict[int, datetime] = {}
+    last_pruned = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                window_start = datetime.utcnow() - INVALIDATION_LOOKBACK
+                rows = (await db.execute(
+                    select(CacheInvalidation.id, CacheInvalidation.key, CacheInvalidation.created_at)
+                    .filter(or_(CacheInvalidation.id > last_seen, CacheInvalidation.created_at > window_start))
+                    .order_by(CacheInvalidation.id)
+                )).all()
+                for row_id, key, created_at in rows:
+                    if row_id not in applied:
+                        _dispatch(key)
+                        applied[row_id] = created_at
+                    last_seen = max(last_seen, row_id)
+                for row_id in [row_id for row_id, created_at in applied.items() if created_at <= window_start]:
+                    del applied[row_id]
+                if time.monotonic() - last_pruned > INVALIDATION_RETENTION.total_seconds():
+                    cutoff = datetime.utcnow() - INVALIDATION_RETENTION
+                    await db.execute(delete(CacheInvalidation).filter(CacheInvalidation.created_at < cutoff))
+                    await db.commit()
+                    last_pruned = time.monotonic()
+        except Exception as exc:
+            # A missed poll only delays eviction; local caches still expire on their own
+            print(f"⚠️  Cache invalidation poll failed: {exc}")
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+# HS256 keeps the shared-secret behaviour; RS256/ES256 sign access tokens with
+# a private key so other services can verify them from the JWKS document.
+# (python-jose has no EdDSA support, so ES256 is the compact option.)
+ACCESS_TOKEN_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+# How often an unknown kid may trigger a reload from disk (another worker rotated)
+KEY_RELOAD_INTERVAL_SECONDS = 1.0
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _int_b64url(value: int, length: Optional[int] = None) -> str:
+    length = length or (value.bit_length() + 7) // 8
+    return _b64url(value.to_bytes(length, "big"))
+
+
+def public_jwk(private_key) -> dict:
+    """Public JWK (without kid) for an RSA or P-256 private key"""
+    numbers = private_key.public_key().public_numbers()
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return {"kty": "RSA", "n": _int_b64url(numbers.n), "e": _int_b64url(numbers.e)}
+    return {"kty": "EC", "crv": "P-256", "x": _int_b64url(numbers.x, 32), "y": _int_b64url(numbers.y, 32)}
+
+
+def thumbprint(jwk: dict) -> str:
+    """RFC 7638 JWK thumbprint, used as the key id"""
+    required = ("e", "kty", "n") if jwk["kty"] == "RSA" else ("crv", "kty", "x", "y")
+    canonical = json.dumps({name: jwk[name] for name in required}, separators=(",", ":"), sort_keys=True)
+    return _b64url(hashlib.sha256(canonical.encode("utf-8")).digest())
+
+
+class KeyRing:
+    """Signing keys on disk: the newest signs, all of them verify
+
+    Each key is <kid>.pem in JWT_KEYS_DIR. Rotating adds a new file; keep the
+    old one until every token it signed has expired, then delete it.
+    """
+
+    def __init__(self, directory: str = JWT_KEYS_DIR, algorithm: str = ACCESS_TOKEN_ALGORITHM):
+        self.directory = directory
+        self.algorithm = algorithm
+        self._lock = threading.Lock()
+        self._signing_kid: Optional[str] = None
+        self._private_pems: Dict[str, str] = {}
+        self._public_pems: Dict[str, str] = {}
+        self._jwks_body = b'{"keys":[]}'
+        self._jwks_etag = ""
+        self._last_reload = 0.0
+        self._dir_mtime = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def load(self):
+        """Read every key from disk, creating the first one if there is none"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        dir_mtime = os.path.getmtime(self.directory)
+        paths = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".pem")),
+            key=os.path.getmtime,
+        )
+        if not paths:
+            self.rotate()
+            return
+
+        private_pems, public_pems, jwks = {}, {}, []
+        for path in paths:
+            with open(path, "rb") as f:
+                pem = f.read()
+            private_key = serialization.load_pem_private_key(pem, password=None)
+            jwk = public_jwk(private_key)
+            kid = os.path.basename(path)[:-len(".pem")]
+            private_pems[kid] = pem.decode("ascii")
+            public_pems[kid] = private_key.public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+            ).decode("ascii")
+            jwks.append({**jwk, "kid": kid, "use": "sig", "alg": self.algorithm})
+
+        body = json.dumps({"keys": jwks}, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._private_pems = private_pems
+            self._public_pems = public_pems
+            self._signing_kid = os.path.basename(paths[-1])[:-len(".pem")]
+            self._jwks_body = body
+            self._jwks_etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            self._last_reload = time.monotonic()
+            self._dir_mtime = dir_mtime
+
+    def _reload_if_changed(self):
+        """Pick up keys added or removed on disk, e.g. by `python keys.py rotate`"""
+        try:
+            changed = os.path.getmtime(self.directory) != self._dir_mtime
+        except OSError:
+            return
+        if changed:
+            self.load()
+
+    def rotate(self) -> str:
+        """Generate a new signing key; existing keys stay valid for verification"""
+        if self.algorithm == "RS256":
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        else:
+            private_key = ec.generate_private_key(ec.SECP256R1())
+        kid = thumbprint(public_jwk(private_key))
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{kid}.pem")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        self.load()
+        return kid
+
+    def signing_key(self):
+        """(kid, private PEM) used to sign new tokens"""
+        self._reload_if_changed()
+        return self._signing_kid, self._private_pems[self._signing_kid]
+
+    def verification_key(self, kid: str) -> Optional[str]:
+        """Public PEM for kid, reloading from disk once if another worker rotated"""
+        pem = self._public_pems.get(kid)
+        if pem is None and time.monotonic() - self._last_reload > KEY_RELOAD_INTERVAL_SECONDS:
+            self.load()
+            pem = self._public_pems.get(kid)
+        return pem
+
+    def jwks(self):
+        """(serialized JWKS document, ETag)"""
+        self._reload_if_changed()
+        return self._jwks_body, self._jwks_etag
+
+
+key_ring = KeyRing()
+
+
+if __name__ == "__main__":
+    # python keys.py rotate
+    if sys.argv[1:] != ["rotate"]:
+        sys.exit("usage: JWT_ALGORITHM=RS256|ES256 python keys.py rotate")
+    if not key_ring.enabled:
+        sys.exit(f"JWT_ALGORITHM={ACCESS_TOKEN_ALGORITHM} does not use key pairs")
+    print(f"New signing key: {key_ring.rotate()}")
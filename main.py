@@ -1,48 +1,62 @@
-import os
+import json
 import asyncio
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, status
-from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, BackgroundTasks, FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, EmailStr
-from database import Base, engine, SessionLocal
+from database import get_db
 from models import News, Contact, User
+from pagination import paginate_news, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from search import search_news, MAX_SEARCH_OFFSET
+from news_fields import resolve_news_fields, news_columns_query
+from cache import (
+    response_cache,
+    news_versions,
+    invalidate_news,
+    etag_matches,
+    not_modified_since,
+    http_date,
+    news_tag,
+    NEWS_LIST_TAG
+)
+from metrics import collect_metrics
+from user_cache import invalidate_user
+from invalidation import poll_invalidations
+from revocation import prune_revocations_periodically
+from denylist import access_denylist
+from keys import key_ring
+from throttle import login_throttle
+from passwords import configure_password_policy
+from bootstrap import init_database, load_process_state, BOOTSTRAP_ON_STARTUP
+from upload_storage import upload_pipeline, release_image, UploadFiles, UploadSizeLimit, UPLOAD_DIR
+from image_variants import build_news_image_variants, image_variant_pool
+from upload_gc import collect_uploads_periodically, UPLOAD_GC_INTERVAL_SECONDS
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from auth import (
     create_access_token,
     authenticate_user,
+    get_access_token_payload,
     get_current_active_user,
-    create_admin_user,
-    get_password_hash,
-    get_current_user_from_refresh_token,
+    get_current_active_user_record,
+    token_claims,
+    verify_password_async,
+    get_password_hash_async,
+    rotate_refresh_token,
+    revoke_refresh_token,
     create_refresh_token,
     REFRESH_TOKEN_EXPIRE_DAYS,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Create admin user automatically
-db = SessionLocal()
-create_admin_user(db)
-db.close()
+router = APIRouter()
 
-app = FastAPI(title="News + Contact API")
-
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-)
-
-@app.options("/{rest_of_path:path}")
+@router.options("/{rest_of_path:path}")
 async def preflight_handler():
     return {}
 
@@ -55,31 +69,46 @@ async def keep_alive():
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"⏰ Keep-alive heartbeat at {current_time} - Server is active!")
 
-@app.on_event("startup")
-async def startup_event():
-    """Run tasks on application startup"""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Bootstrap this worker, run background tasks, and stop them on shutdown"""
     print("🚀 Server starting up...")
+    # Pick (and optionally calibrate) the password hashing policy before any hashing
+    configure_password_policy()
+    if BOOTSTRAP_ON_STARTUP:
+        init_database()
+    load_process_state()
     print("💓 Keep-alive service initialized - heartbeat every 10 minutes")
-    asyncio.create_task(keep_alive())
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Run tasks on application shutdown"""
+    tasks = [
+        asyncio.create_task(keep_alive()),
+        asyncio.create_task(poll_invalidations()),
+        asyncio.create_task(prune_revocations_periodically()),
+    ]
+    if UPLOAD_GC_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(collect_uploads_periodically()))
+    yield
     print("🛑 Server shutting down...")
-
-# Ensure upload directory exists
-os.makedirs("uploads", exist_ok=True)
-
-# Serve uploaded images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
-# DB session dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    for task in tasks:
+        task.cancel()
+    image_variant_pool.shutdown()
+
+def model_to_dict(obj) -> dict:
+    """Column values of an ORM object, for building a response schema outside FastAPI"""
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+def conditional_json_response(request: Request, etag: str, body: bytes, headers: dict) -> Response:
+    """Send a JSON body, or 304 when If-Modified-Since shows the client is current"""
+    headers = {"ETag": etag, **headers}
+    # If-None-Match takes precedence; it has already been checked by the caller
+    if "if-none-match" not in request.headers and not_modified_since(
+        request.headers.get("if-modified-since"), headers.get("Last-Modified")
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def render_json(data) -> bytes:
+    """Serialize data the same way JSONResponse does, so cached bodies match live ones"""
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 # ------------------ Schemas ------------------
 
@@ -118,11 +147,48 @@ class NewsResponse(BaseModel):
     content: str
     author: str
     image_url: Optional[str] = None
+    image_srcset: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class NewsListItem(BaseModel):
+    id: int
     created_at: datetime
+    title: Optional[str] = None
+    excerpt: Optional[str] = None
+    content: Optional[str] = None
+    author: Optional[str] = None
+    image_url: Optional[str] = None
+    image_srcset: Optional[str] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
+class NewsPage(BaseModel):
+    items: List[NewsListItem]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class NewsSearchResult(BaseModel):
+    id: int
+    title: str
+    author: Optional[str] = None
+    image_url: Optional[str] = None
+    image_srcset: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    title_highlight: str
+    snippet: str
+    score: float
+
+class NewsSearchPage(BaseModel):
+    items: List[NewsSearchResult]
+    next_offset: Optional[int] = None
+
 class NewsUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -155,36 +221,65 @@ class ContactUpdate(BaseModel):
         orm_mode = True
 
 
-@app.get("/")
+@router.get("/")
 def home():
     return {"message": "Code is running ✅"}
 
+@router.get("/metrics")
+def get_metrics(current_user: User = Depends(get_current_active_user)):
+    """Cache and performance counters (requires authentication)"""
+    return collect_metrics()
+
 # ------------------ AUTH ENDPOINTS ------------------
 
-@app.post("/login", response_model=Token)
+@router.get("/.well-known/jwks.json")
+def jwks(request: Request):
+    """Public keys for verifying access tokens (empty when tokens use a shared secret)"""
+    body, etag = key_ring.jwks()
+    headers = {"Cache-Control": "public, max-age=300"}
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login endpoint - returns JWT tokens"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # Throttle before any bcrypt work so a credential-stuffing burst stays cheap
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_throttle.retry_after(form_data.username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        login_throttle.record_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.record_success(form_data.username)
     
     # Create access token (short-lived)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
     # Create refresh token (long-lived)
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     refresh_token = create_refresh_token(
-        data={"sub": user.username}, expires_delta=refresh_token_expires
+        data=token_claims(user), expires_delta=refresh_token_expires
     )
     
     return {
@@ -194,10 +289,10 @@ async def login(
     }
 
 # Add new refresh token endpoint
-@app.post("/refresh", response_model=Token)
+@router.post("/refresh", response_model=Token)
 async def refresh_token(
     refresh_token: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Refresh access token using refresh token"""
     if not refresh_token:
@@ -206,19 +301,19 @@ async def refresh_token(
             detail="Refresh token is required"
         )
     
-    # Validate refresh token and get user
-    user = await get_current_user_from_refresh_token(refresh_token, db)
+    # Validate and spend the refresh token (each one works once)
+    user, family = await rotate_refresh_token(refresh_token, db)
     
     # Create new access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
-    # Optionally create new refresh token (rotate refresh token)
+    # Rotate: the replacement stays in the same token family
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     new_refresh_token = create_refresh_token(
-        data={"sub": user.username}, expires_delta=refresh_token_expires
+        data={**token_claims(user), "fam": family}, expires_delta=refresh_token_expires
     )
     
     return {
@@ -227,102 +322,187 @@ async def refresh_token(
         "token_type": "bearer"
     }
 
-@app.post("/logout")
-async def logout(current_user: User = Depends(get_current_active_user)):
-    """Logout endpoint (client should delete token)"""
+@router.post("/logout")
+async def logout(
+    refresh_token: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_active_user),
+    token_payload: dict = Depends(get_access_token_payload),
+    db: AsyncSession = Depends(get_db)
+):
+    """Logout endpoint; denies the access token and revokes the session's refresh tokens when given"""
+    if token_payload.get("jti"):
+        await access_denylist.revoke(db, token_payload["jti"], token_payload["exp"])
+    if refresh_token:
+        await revoke_refresh_token(refresh_token, current_user.username, db)
     return {"message": "Successfully logged out"}
 
-@app.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+@router.get("/me", response_model=UserResponse)
+async def get_current_user_info(current_user: User = Depends(get_current_active_user_record)):
     """Get current user information"""
     return current_user
 
-@app.patch("/me", response_model=UserResponse)
+@router.patch("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_record),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user information (partial update)"""
     update_data = user_update.dict(exclude_unset=True)
+    was_active = current_user.is_active
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
+
+    # Status changes revoke outstanding tokens
+    if current_user.is_active != was_active:
+        current_user.token_version = (current_user.token_version or 0) + 1
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    await invalidate_user(db, current_user.username)
     return current_user
 
-@app.post("/change-password")
+@router.post("/change-password")
 async def change_password(
     password_data: ChangePasswordRequest,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_record),
+    db: AsyncSession = Depends(get_db)
 ):
     """Change user password"""
-    from auth import verify_password
-    
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
+    current_user.token_version = (current_user.token_version or 0) + 1
+    await db.commit()
+    await invalidate_user(db, current_user.username)
     
     return {"message": "Password changed successfully"}
 
 # ------------------ NEWS ENDPOINTS (Protected) ------------------
 
-@app.post("/news", response_model=NewsResponse)
+@router.post("/news", response_model=NewsResponse)
 async def create_news(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     content: str = Form(...),
     author: str = Form("Anonymous"),
     image: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Create news article (requires authentication)"""
     image_url = None
     if image:
-        file_path = f"uploads/{image.filename}"
-        with open(file_path, "wb") as f:
-            f.write(await image.read())
-        image_url = f"/uploads/{image.filename}"
+        image_url = await upload_pipeline.save(image, db)
 
     new_article = News(title=title, content=content, author=author, image_url=image_url)
     db.add(new_article)
-    db.commit()
-    db.refresh(new_article)
+    # Flush for the id, so the new article's own tag is bumped (and timestamped) too
+    await db.flush()
+    await invalidate_news(db, new_article.id)
+    await db.refresh(new_article)
+    if image_url:
+        background_tasks.add_task(build_news_image_variants, new_article.id, image_url)
     return new_article
 
 
-@app.get("/news", response_model=List[NewsResponse])
-def get_all_news(db: Session = Depends(get_db)):
-    """Get all news articles (public)"""
-    return db.query(News).all()
-
-
-@app.get("/news/{news_id}", response_model=NewsResponse)
-def get_news(news_id: int, db: Session = Depends(get_db)):
+@router.get("/news", response_model=NewsPage, response_model_exclude_unset=True)
+async def get_all_news(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    view: str = Query("full", description="full or summary (excerpt instead of content)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    modified_since: Optional[datetime] = Query(None, description="Only articles updated after this time"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of news articles, newest first (public)"""
+    etag = await news_versions.etag(db, NEWS_LIST_TAG)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    if modified_since is not None and modified_since.tzinfo is not None:
+        modified_since = modified_since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    field_names = resolve_news_fields(view, fields)
+    cache_key = f"news:list:{limit}:{cursor or ''}:{','.join(field_names)}:{modified_since or ''}"
+    cached = response_cache.get(cache_key)
+    if cached is None:
+        generation = response_cache.generation
+        # Shared by all workers: the list's last write, or the newest article before any
+        _, modified_at = await news_versions.get(db, NEWS_LIST_TAG)
+        if modified_at is None:
+            modified_at = (await db.execute(select(func.max(News.updated_at)))).scalar()
+        query = news_columns_query(field_names)
+        if modified_since is not None:
+            query = query.filter(News.updated_at > modified_since)
+        page = await paginate_news(db, query, limit, cursor)
+        page["items"] = [dict(row._mapping) for row in page["items"]]
+        body = render_json(NewsPage(**page).dict(exclude_unset=True))
+        cached = (body, {"Last-Modified": http_date(modified_at)} if modified_at else {})
+        response_cache.set(cache_key, body, tags=[NEWS_LIST_TAG], generation=generation, headers=cached[1])
+    return conditional_json_response(request, etag, *cached)
+
+
+@router.get("/news/search", response_model=NewsSearchPage)
+async def search_all_news(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    db: AsyncSession = Depends(get_db)
+):
+    """Full-text search over news titles and content, best matches first (public)"""
+    cache_key = f"news:search:{limit}:{offset}:{q}"
+    cached = response_cache.get(cache_key)
+    if cached is None:
+        generation = response_cache.generation
+        body = render_json(NewsSearchPage(**await search_news(db, q, limit, offset)).dict())
+        cached = (body, {})
+        response_cache.set(cache_key, body, tags=[NEWS_LIST_TAG], generation=generation)
+    return Response(content=cached[0], media_type="application/json")
+
+
+@router.get("/news/{news_id}", response_model=NewsResponse)
+async def get_news(news_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """Get single news article (public)"""
-    article = db.query(News).filter(News.id == news_id).first()
-    if not article:
-        raise HTTPException(status_code=404, detail="News not found")
-    return article
-
-
-@app.put("/news/{news_id}", response_model=NewsResponse)
+    version, _ = await news_versions.get(db, news_tag(news_id))
+    etag = await news_versions.etag(db, news_tag(news_id))
+    if_none_match = request.headers.get("if-none-match")
+    # Only a bumped version shows the article was written; "*" and unversioned
+    # articles are matched after the lookup, so a missing one is still a 404
+    if version and (if_none_match or "").strip() != "*" and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache_key = f"news:item:{news_id}"
+    cached = response_cache.get(cache_key)
+    if cached is None:
+        generation = response_cache.generation
+        article = await db.get(News, news_id)
+        if not article:
+            raise HTTPException(status_code=404, detail="News not found")
+        body = render_json(NewsResponse(**model_to_dict(article)).dict())
+        cached = (body, {"Last-Modified": http_date(article.updated_at or article.created_at)})
+        response_cache.set(cache_key, body, tags=[news_tag(news_id)], generation=generation, headers=cached[1])
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return conditional_json_response(request, etag, *cached)
+
+
+@router.put("/news/{news_id}", response_model=NewsResponse)
 async def update_news(
     news_id: int,
+    background_tasks: BackgroundTasks,
     title: str = Form(None),
     content: str = Form(None),
     author: str = Form(None),
     image: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Update news article (requires authentication)"""
-    article = db.query(News).filter(News.id == news_id).first()
+    article = await db.get(News, news_id)
     if not article:
         raise HTTPException(status_code=404, detail="News not found")
 
@@ -333,17 +513,18 @@ async def update_news(
     if author:
         article.author = author
     if image:
-        file_path = f"uploads/{image.filename}"
-        with open(file_path, "wb") as f:
-            f.write(await image.read())
-        article.image_url = f"/uploads/{image.filename}"
-
-    db.commit()
-    db.refresh(article)
+        image_url = await upload_pipeline.save(image, db)
+        await release_image(db, article.image_url)
+        article.image_url = image_url
+        article.image_srcset = None
+        background_tasks.add_task(build_news_image_variants, news_id, image_url)
+
+    await invalidate_news(db, news_id)
+    await db.refresh(article)
     return article
 
 
-# @app.patch("/news/{news_id}", response_model=NewsResponse)
+# @router.patch("/news/{news_id}", response_model=NewsResponse)
 # async def patch_news(
 #     news_id: int,
 #     title: Optional[str] = Form(None),
@@ -377,10 +558,11 @@ async def update_news(
 #     db.refresh(article)
 #     return article
 
-@app.patch("/news/{news_id}", response_model=NewsResponse)
+@router.patch("/news/{news_id}", response_model=NewsResponse)
 async def patch_news(
     news_id: int,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     title: Optional[str] = Form(None),
     content: Optional[str] = Form(None),
@@ -388,7 +570,7 @@ async def patch_news(
     image: Optional[UploadFile] = File(None)
 ):
     """Partially update news article (requires authentication)"""
-    article = db.query(News).filter(News.id == news_id).first()
+    article = await db.get(News, news_id)
     if not article:
         raise HTTPException(status_code=404, detail="News not found")
 
@@ -405,74 +587,77 @@ async def patch_news(
         article.author = author
         updated = True
     if image is not None:
-        file_path = f"uploads/{image.filename}"
-        with open(file_path, "wb") as f:
-            f.write(await image.read())
-        article.image_url = f"/uploads/{image.filename}"
+        image_url = await upload_pipeline.save(image, db)
+        await release_image(db, article.image_url)
+        article.image_url = image_url
+        article.image_srcset = None
+        background_tasks.add_task(build_news_image_variants, news_id, image_url)
         updated = True
 
     if not updated:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    db.commit()
-    db.refresh(article)
+    await invalidate_news(db, news_id)
+    await db.refresh(article)
     return article
 
-@app.delete("/news/{news_id}")
-def delete_news(
+@router.delete("/news/{news_id}")
+async def delete_news(
     news_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Delete news article (requires authentication)"""
-    article = db.query(News).filter(News.id == news_id).first()
+    article = await db.get(News, news_id)
     if not article:
         raise HTTPException(status_code=404, detail="News not found")
 
-    db.delete(article)
-    db.commit()
+    await release_image(db, article.image_url)
+    await db.delete(article)
+    await invalidate_news(db, news_id)
     return {"detail": "News deleted"}
 
 # ------------------ CONTACT ENDPOINTS ------------------
 
-@app.post("/contact", response_model=ContactResponse)
-def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
+@router.post("/contact", response_model=ContactResponse)
+async def create_contact(contact: ContactCreate, db: AsyncSession = Depends(get_db)):
     """Create contact submission (public)"""
     new_contact = Contact(**contact.dict())
     db.add(new_contact)
-    db.commit()
-    db.refresh(new_contact)
+    await db.commit()
+    await db.refresh(new_contact)
     return new_contact
 
-@app.get("/contact", response_model=List[ContactResponse])
-def get_contacts(
-    db: Session = Depends(get_db),
+@router.get("/contact", response_model=List[ContactResponse])
+async def get_contacts(
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Get all contacts (requires authentication)"""
-    return db.query(Contact).all()
+    result = await db.execute(select(Contact))
+    return result.scalars().all()
 
-@app.get("/contact/{contact_id}", response_model=ContactResponse)
-def get_contact(
+@router.get("/contact/{contact_id}", response_model=ContactResponse)
+async def get_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Get single contact (requires authentication)"""
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
+    contact = await db.get(Contact, contact_id)
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
     return contact
 
-@app.patch("/contact/{contact_id}", response_model=ContactResponse)
-def patch_contact(
+@router.patch("/contact/{contact_id}", response_model=ContactResponse)
+async def patch_contact(
     contact_id: int,
     contact_update: ContactUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Partially update contact message (requires authentication)"""
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
+    contact = await db.get(Contact, contact_id)
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
     
@@ -481,23 +666,46 @@ def patch_contact(
     for field, value in update_data.items():
         setattr(contact, field, value)
     
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     return contact
 
-@app.delete("/contact/{contact_id}")
-def delete_contact(
+@router.delete("/contact/{contact_id}")
+async def delete_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Protected
 ):
     """Delete contact message (requires authentication)"""
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
+    contact = await db.get(Contact, contact_id)
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
-    db.delete(contact)
-    db.commit()
+    await db.delete(contact)
+    await db.commit()
     return {"detail": "Contact deleted"}
 
+def create_app() -> FastAPI:
+    """Build the application; database and key setup happen in its lifespan"""
+    app = FastAPI(title="News + Contact API", lifespan=lifespan)
+
+    # Reject oversized uploads before Starlette spools them to disk; added first
+    # so CORS wraps it and the 413 reaches browser clients
+    app.add_middleware(UploadSizeLimit)
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+
+    # Serve uploaded images (the directory may not exist until bootstrap runs)
+    app.mount("/uploads", UploadFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=5000, reload=True)
\ No newline at end of file
@@ -0,0 +1,14 @@
+from typing import Callable, Dict
+
+# name -> callable returning a dict of current values
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, collector: Callable[[], dict]):
+    """Register a callable whose snapshot is reported under `name` by GET /metrics"""
+    _collectors[name] = collector
+
+
+def collect_metrics() -> dict:
+    """Snapshot every registered collector"""
+    return {name: collector() for name, collector in _collectors.items()}
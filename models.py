@@ -1,8 +1,20 @@
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index, event
 from datetime import datetime
 from database import Base
 
+EXCERPT_LENGTH = 280
+
+
+def make_excerpt(content: str, length: int = EXCERPT_LENGTH) -> str:
+    """Collapse whitespace and cut content at a word boundary for listings"""
+    text = " ".join((content or "").split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0]
+    return cut + "…"
+
+
 class News(Base):
     __tablename__ = "news"
 
@@ -11,7 +23,25 @@ class News(Base):
     content = Column(Text, nullable=False)
     author = Column(String(100))
     image_url = Column(String(255), nullable=True)
+    # srcset of resized variants of image_url, filled in after upload
+    image_srcset = Column(Text, nullable=True)
+    excerpt = Column(String(300), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Supports keyset pagination ordered by (created_at, id)
+        Index("ix_news_created_at_id", "created_at", "id"),
+        # Supports ?modified_since= change feeds
+        Index("ix_news_updated_at", "updated_at"),
+    )
+
+
+@event.listens_for(News, "before_insert")
+@event.listens_for(News, "before_update")
+def set_news_excerpt(mapper, connection, target):
+    """Keep the precomputed excerpt in step with the article content"""
+    target.excerpt = make_excerpt(target.content)
 
 
 class Contact(Base):
@@ -34,4 +64,53 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # Bumped on password or status changes to revoke outstanding self-contained tokens
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CacheInvalidation(Base):
+    """Invalidation log that every worker process polls to evict its local caches"""
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class RevokedToken(Base):
+    """Revoked refresh-token jtis and token families ("fam:<id>"), kept until they expire"""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class StoredImage(Base):
+    """An uploaded image stored once under its SHA-256, with the number of articles using it"""
+    __tablename__ = "stored_images"
+
+    digest = Column(String(64), primary_key=True)
+    path = Column(String(255), nullable=False)  # relative to the upload directory
+    content_type = Column(String(50), nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Last time ref_count changed; unreferenced images are collected some time after it
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ContentVersion(Base):
+    """Version and last-modified time per cache tag, bumped with every write; shared by all workers"""
+    __tablename__ = "content_versions"
+
+    tag = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    modified_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ScheduledRun(Base):
+    """When a periodic job last started in any worker, so only one of them runs it"""
+    __tablename__ = "scheduled_runs"
+
+    name = Column(String(50), primary_key=True)
+    started_at = Column(DateTime, nullable=False)
@@ -0,0 +1,64 @@
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from models import News, make_excerpt
+
+# Columns a listing may request, in response order
+NEWS_FIELDS = ("id", "title", "excerpt", "content", "author", "image_url", "image_srcset", "created_at", "updated_at")
+
+VIEWS = {
+    "full": ("id", "title", "content", "author", "image_url", "image_srcset", "created_at", "updated_at"),
+    "summary": ("id", "title", "excerpt", "author", "image_url", "image_srcset", "created_at", "updated_at"),
+}
+
+# Pagination orders on these, so they are always selected
+REQUIRED_FIELDS = ("id", "created_at")
+
+
+def resolve_news_fields(view: str = "full", fields: Optional[str] = None) -> List[str]:
+    """Turn ?view= / ?fields= into the list of News columns to select"""
+    if fields:
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in NEWS_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    elif view in VIEWS:
+        requested = list(VIEWS[view])
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown view: {view}")
+
+    selected = set(requested) | set(REQUIRED_FIELDS)
+    return [name for name in NEWS_FIELDS if name in selected]
+
+
+def news_columns_query(field_names: List[str]):
+    """Select only the given News columns, so unrequested bodies are never read"""
+    return select(*(getattr(News, name) for name in field_names))
+
+
+def backfill_news_excerpts(db: Session, batch_size: int = 500) -> int:
+    """Fill in excerpts for articles written before the column existed"""
+    filled = 0
+    while True:
+        batch = db.query(News.id, News.content).filter(News.excerpt.is_(None)).limit(batch_size).all()
+        if not batch:
+            return filled
+        for news_id, content in batch:
+            # Setting updated_at to itself stops onupdate from marking the article as changed
+            db.execute(
+                update(News)
+                .where(News.id == news_id)
+                .values(excerpt=make_excerpt(content), updated_at=News.updated_at)
+            )
+        db.commit()
+        filled += len(batch)
+
+
+def backfill_news_updated_at(db: Session) -> int:
+    """Treat articles written before updated_at existed as last modified at creation"""
+    result = db.execute(
+        update(News).where(News.updated_at.is_(None)).values(updated_at=News.created_at)
+    )
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import News
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+NEXT = "next"
+PREV = "prev"
+
+
+def encode_cursor(article: News, direction: str) -> str:
+    """Encode an article's (created_at, id) position as an opaque cursor"""
+    payload = {"c": article.created_at.isoformat(), "i": article.id, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, str]:
+    """Decode a cursor back into (created_at, id, direction)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = datetime.fromisoformat(payload["c"])
+        news_id = int(payload["i"])
+        direction = payload["d"]
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, news_id, direction
+
+
+async def paginate_news(db: AsyncSession, query: Select, limit: int, cursor: Optional[str] = None) -> dict:
+    """Return one page of news, newest first, using keyset pagination on (created_at, id)"""
+    position = tuple_(News.created_at, News.id)
+
+    direction = NEXT
+    if cursor:
+        created_at, news_id, direction = decode_cursor(cursor)
+        if direction == NEXT:
+            query = query.filter(position < (created_at, news_id))
+        else:
+            query = query.filter(position > (created_at, news_id))
+
+    if direction == NEXT:
+        query = query.order_by(News.created_at.desc(), News.id.desc())
+    else:
+        query = query.order_by(News.created_at.asc(), News.id.asc())
+
+    # Fetch one extra row to learn whether another page exists
+    result = await db.execute(query.limit(limit + 1))
+    rows: List[News] = list(result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    prev_cursor = None
+    if direction == NEXT:
+        if has_more:
+            next_cursor = encode_cursor(rows[-1], NEXT)
+        if cursor and rows:
+            prev_cursor = encode_cursor(rows[0], PREV)
+    else:
+        rows.reverse()
+        if has_more:
+            prev_cursor = encode_cursor(rows[0], PREV)
+        if rows:
+            next_cursor = encode_cursor(rows[-1], NEXT)
+
+    return {"items": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from fastapi import HTTPException, status
+from metrics import register_metrics
+
+try:
+    import argon2
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # argon2id support is optional
+    argon2 = None
+
+# "bcrypt" or "argon2id"
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+# When set, startup calibration picks the cost that makes one verify take about this long
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "0")) or None
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST_KIB = int(os.getenv("ARGON2_MEMORY_COST_KIB", str(64 * 1024)))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+ARGON2_MIN_TIME_COST = 2
+ARGON2_MAX_TIME_COST = 20
+
+# bcrypt and argon2 release the GIL, so threads give real parallelism for hashing
+PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+# Calls allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_MAX_QUEUE = 32
+# Recent calls kept for latency percentiles
+TIMING_WINDOW = 1000
+
+
+def truncate_to_72_bytes(password: str) -> bytes:
+    """Truncate password to exactly 72 bytes for bcrypt"""
+    encoded = password.encode('utf-8')
+    if len(encoded) > 72:
+        return encoded[:72]
+    return encoded
+
+
+class BcryptPolicy:
+    """bcrypt at a fixed cost"""
+    scheme = "bcrypt"
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS):
+        self.rounds = rounds
+
+    @staticmethod
+    def identifies(hashed: str) -> bool:
+        return hashed.startswith("$2")
+
+    def hash(self, password: str) -> str:
+        return bcrypt.hashpw(truncate_to_72_bytes(password), bcrypt.gensalt(rounds=self.rounds)).decode("utf-8")
+
+    @staticmethod
+    def verify(password: str, hashed: str) -> bool:
+        try:
+            return bcrypt.checkpw(truncate_to_72_bytes(password), hashed.encode("utf-8"))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # $2b$<rounds>$... Only upgrades: workers that calibrated a round lower
+        # must not downgrade hashes that others made stronger.
+        return not self.identifies(hashed) or int(hashed.split("$")[2]) < self.rounds
+
+    def calibrate(self, target_ms: float) -> "BcryptPolicy":
+        """Time a cheap hash and extrapolate: each extra round doubles the cost"""
+        probe_rounds = 8
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=probe_rounds))
+        probe_ms = (time.perf_counter() - started) * 1000
+        rounds = probe_rounds
+        while rounds < BCRYPT_MAX_ROUNDS and probe_ms * 2 ** (rounds + 1 - probe_rounds) <= target_ms:
+            rounds += 1
+        return BcryptPolicy(max(BCRYPT_MIN_ROUNDS, rounds))
+
+    def describe(self) -> dict:
+        return {"scheme": self.scheme, "rounds": self.rounds}
+
+
+class Argon2Policy:
+    """argon2id with explicit time/memory/parallelism parameters"""
+    scheme = "argon2id"
+
+    def __init__(
+        self,
+        time_cost: int = ARGON2_TIME_COST,
+        memory_cost: int = ARGON2_MEMORY_COST_KIB,
+        parallelism: int = ARGON2_PARALLELISM,
+    ):
+        if argon2 is None:
+            raise RuntimeError("PASSWORD_HASH_SCHEME=argon2id needs the argon2-cffi package")
+        self.time_cost = time_cost
+        self.memory_cost = memory_cost
+        self.parallelism = parallelism
+        self._hasher = argon2.PasswordHasher(
+            time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism, type=argon2.Type.ID
+        )
+
+    @staticmethod
+    def identifies(hashed: str) -> bool:
+        return hashed.startswith("$argon2id$")
+
+    def hash(self, password: str) -> str:
+        return self._hasher.hash(password)
+
+    @staticmethod
+    def verify(password: str, hashed: str) -> bool:
+        if argon2 is None:
+            return False
+        try:
+            return argon2.PasswordHasher().verify(hashed, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # $argon2id$v=19$m=65536,t=3,p=4$... Only upgrades, as for bcrypt
+        if not self.identifies(hashed):
+            return True
+        params = dict(item.split("=") for item in hashed.split("$")[3].split(","))
+        return int(params["m"]) < self.memory_cost or int(params["t"]) < self.time_cost
+
+    def calibrate(self, target_ms: float) -> "Argon2Policy":
+        """Time one pass at the configured memory and scale time_cost linearly"""
+        probe = argon2.PasswordHasher(
+            time_cost=1, memory_cost=self.memory_cost, parallelism=self.parallelism, type=argon2.Type.ID
+        )
+        started = time.perf_counter()
+        probe.hash("calibration")
+        per_pass_ms = (time.perf_counter() - started) * 1000
+        time_cost = int(target_ms // per_pass_ms) if per_pass_ms else ARGON2_MAX_TIME_COST
+        time_cost = min(ARGON2_MAX_TIME_COST, max(ARGON2_MIN_TIME_COST, time_cost))
+        return Argon2Policy(time_cost, self.memory_cost, self.parallelism)
+
+    def describe(self) -> dict:
+        return {
+            "scheme": self.scheme,
+            "time_cost": self.time_cost,
+            "memory_cost_kib": self.memory_cost,
+            "parallelism": self.parallelism,
+        }
+
+
+POLICIES = {"bcrypt": BcryptPolicy, "argon2id": Argon2Policy}
+# Hashes are verified by whichever scheme produced them, whatever the current policy
+VERIFIERS = (BcryptPolicy, Argon2Policy)
+
+# Current policy; bcrypt at 12 rounds until configure_password_policy() runs
+password_policy = BcryptPolicy()
+
+
+def configure_password_policy(scheme: str = PASSWORD_HASH_SCHEME, target_ms: Optional[float] = PASSWORD_HASH_TARGET_MS):
+    """Build the policy from configuration, calibrating it when a target latency is set"""
+    global password_policy
+    if scheme not in POLICIES:
+        raise RuntimeError(f"Unknown PASSWORD_HASH_SCHEME: {scheme}")
+    policy = POLICIES[scheme]()
+    if target_ms:
+        policy = policy.calibrate(target_ms)
+    password_policy = policy
+    return policy
+
+
+def hash_password(password: str) -> str:
+    """Hash with the current policy"""
+    return password_policy.hash(password)
+
+
+def verify_password_hash(password: str, hashed: str) -> bool:
+    """Verify against any supported scheme"""
+    for verifier in VERIFIERS:
+        if verifier.identifies(hashed):
+            return verifier.verify(password, hashed)
+    return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """Whether a stored hash is of another scheme or weaker than the current policy"""
+    return password_policy.needs_rehash(hashed)
+
+
+class PasswordHashPool:
+    """Bounded thread pool that keeps password hashing off the event loop"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._wait_ms = deque(maxlen=TIMING_WINDOW)
+        self._run_ms = deque(maxlen=TIMING_WINDOW)
+        self.calls = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, or fail with 503 when the queue is full"""
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password operations in progress, try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._wait_ms.append((started - submitted) * 1000)
+                    self._run_ms.append((finished - started) * 1000)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.calls += 1
+
+    def typical_run_seconds(self) -> float:
+        """Median recent hashing time, or a 12-round bcrypt estimate before any call"""
+        with self._lock:
+            if not self._run_ms:
+                return 0.25
+            return sorted(self._run_ms)[len(self._run_ms) // 2] / 1000
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "wait_ms": _percentiles(self._wait_ms),
+                "run_ms": _percentiles(self._run_ms),
+            }
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+password_pool = PasswordHashPool()
+register_metrics("password_hashing", password_pool.stats)
+register_metrics("password_policy", lambda: password_policy.describe())
@@ -0,0 +1,125 @@
+import asyncio
+import calendar
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal
+from denylist import access_denylist
+from invalidation import publish_invalidation, register_invalidation_handler
+from metrics import register_metrics
+from models import RevokedToken
+
+# How often each process drops expired revocations from memory and the table
+REVOCATION_PRUNE_SECONDS = 300
+
+
+def family_key(family: str) -> str:
+    return f"fam:{family}"
+
+
+def legacy_token_key(token: str) -> str:
+    """Key for a refresh token issued without a jti (fits revoked_tokens.jti)"""
+    return f"dig:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:56]}"
+
+
+def _timestamp(value: datetime) -> float:
+    return float(calendar.timegm(value.utctimetuple()))
+
+
+class RevocationStore:
+    """In-memory set of revoked token ids backed by the revoked_tokens table
+
+    Checks are a dict lookup. Revocations are written to SQLite (the primary
+    key makes a concurrent double-revoke fail in exactly one process) and
+    announced through the invalidation log so other processes pick them up.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.revoked = 0
+        self.reuse_detected = 0
+
+    def is_revoked(self, key: str) -> bool:
+        expires_at = self._entries.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def add(self, key: str, expires_at: float):
+        """Record a revocation made elsewhere (startup load or another process)"""
+        with self._lock:
+            self._entries[key] = max(expires_at, self._entries.get(key, 0.0))
+
+    async def revoke(self, db: AsyncSession, key: str, expires_at: datetime) -> bool:
+        """Revoke key until expires_at; False if it was already revoked"""
+        ts = _timestamp(expires_at)
+        with self._lock:
+            if self.is_revoked(key):
+                return False
+            self._entries[key] = ts
+        db.add(RevokedToken(jti=key, expires_at=expires_at))
+        publish_invalidation(db, f"revoked:{ts:.0f}:{key}")
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another process revoked it first
+            await db.rollback()
+            return False
+        self.revoked += 1
+        return True
+
+    def load(self, db: Session):
+        """Load unexpired revocations at startup"""
+        now = datetime.utcnow()
+        # Access-token rows ("acc:<jti>") belong to the denylist's filters
+        rows = db.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(~RevokedToken.jti.like("acc:%"), RevokedToken.expires_at > now)
+        )
+        for key, expires_at in rows:
+            self.add(key, _timestamp(expires_at))
+
+    async def prune(self, db: AsyncSession):
+        """Forget expired revocations here and delete expired rows, access-token ones included"""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, expires_at in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+        await db.execute(delete(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()))
+        await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "revoked": self.revoked,
+            "reuse_detected": self.reuse_detected,
+        }
+
+
+revocation_store = RevocationStore()
+register_metrics("refresh_token_revocations", revocation_store.stats)
+
+
+def _apply_published(value: str):
+    expires_at, _, key = value.partition(":")
+    revocation_store.add(key, float(expires_at))
+
+
+register_invalidation_handler("revoked", _apply_published)
+
+
+async def prune_revocations_periodically(interval: float = REVOCATION_PRUNE_SECONDS):
+    """Background task expiring revocation state on a timer rather than on the next revoke"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await revocation_store.prune(db)
+            access_denylist.prune()
+        except Exception as exc:
+            print(f"⚠️  Revocation pruning failed: {exc}")
@@ -0,0 +1,142 @@
+import html
+import re
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# External-content FTS5 index over news.title/news.content, kept in sync by triggers
+FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE news_fts USING fts5(
+        title, content,
+        content='news', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE OF title, content ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO news_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+# Title matches count for more than body matches
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+SNIPPET_TOKENS = 24
+MAX_SEARCH_OFFSET = 1000
+# The database marks matches with control characters; the text is HTML-escaped
+# before they become <mark> tags, so article markup is never passed through
+MARK_START = "\x02"
+MARK_STOP = "\x03"
+HIGHLIGHT_COLUMNS = ("title_highlight", "snippet")
+
+SEARCH_SQL = text(f"""
+    SELECT n.id, n.title, n.author, n.image_url, n.image_srcset, n.created_at, n.updated_at,
+           highlight(news_fts, 0, '{MARK_START}', '{MARK_STOP}') AS title_highlight,
+           snippet(news_fts, 1, '{MARK_START}', '{MARK_STOP}', '…', {SNIPPET_TOKENS}) AS snippet,
+           bm25(news_fts, {TITLE_WEIGHT}, {CONTENT_WEIGHT}) AS score
+    FROM news_fts
+    JOIN news n ON n.id = news_fts.rowid
+    WHERE news_fts MATCH :match
+    ORDER BY score, n.id
+    LIMIT :limit OFFSET :offset
+""")
+
+
+# PostgreSQL: a GIN index over the weighted document the query below ranks with.
+# 'simple' matches FTS5's language-neutral tokenizer (no stemming).
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce({table}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({table}content, '')), 'D')"
+)
+PG_FTS_DDL = f"CREATE INDEX IF NOT EXISTS ix_news_fts ON news USING gin (({PG_DOCUMENT.format(table='')}))"
+# ts_rank weights are {D, C, B, A}; A is the title, D the content
+PG_RANK_WEIGHTS = f"{{{CONTENT_WEIGHT / TITLE_WEIGHT}, 0, 0, 1.0}}"
+
+# ts_rank is higher-is-better, so the score is negated to sort like bm25
+PG_SEARCH_SQL = text(f"""
+    SELECT n.id, n.title, n.author, n.image_url, n.image_srcset, n.created_at, n.updated_at,
+           ts_headline('simple', n.title, q.query,
+                       'StartSel={MARK_START}, StopSel={MARK_STOP}, HighlightAll=true') AS title_highlight,
+           ts_headline('simple', n.content, q.query,
+                       'StartSel={MARK_START}, StopSel={MARK_STOP}, MaxWords={SNIPPET_TOKENS}, MinWords=5, MaxFragments=1') AS snippet,
+           -ts_rank('{PG_RANK_WEIGHTS}', {PG_DOCUMENT.format(table='n.')}, q.query) AS score
+    FROM news n, to_tsquery('simple', :match) AS q(query)
+    WHERE {PG_DOCUMENT.format(table='n.')} @@ q.query
+    ORDER BY score, n.id
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def render_highlight(marked: Optional[str]) -> Optional[str]:
+    """HTML-escape a highlighted fragment, then turn the match markers into <mark> tags"""
+    if marked is None:
+        return None
+    return html.escape(marked).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+def create_search_index(engine: Engine):
+    """Create the FTS5 table and sync triggers, indexing existing articles the first time"""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(PG_FTS_DDL))
+        return
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'")
+        ).first()
+        for statement in FTS_DDL[1:] if exists else FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO news_fts(news_fts) VALUES ('rebuild')"))
+
+
+def build_match_query(q: str) -> str:
+    """Turn free text into a safe FTS5 query: every word required, the last one as a prefix"""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain a word")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def build_tsquery(q: str) -> str:
+    """The PostgreSQL equivalent of build_match_query"""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain a word")
+    return " & ".join(terms) + ":*"
+
+
+async def search_news(db: AsyncSession, q: str, limit: int, offset: int = 0) -> dict:
+    """BM25-ranked news search with highlighted title and content snippet"""
+    if db.bind.dialect.name == "postgresql":
+        statement, match = PG_SEARCH_SQL, build_tsquery(q)
+    else:
+        statement, match = SEARCH_SQL, build_match_query(q)
+    result = await db.execute(statement, {"match": match, "limit": limit + 1, "offset": offset})
+    rows = result.all()
+    has_more = len(rows) > limit
+    items: List[dict] = [dict(row._mapping) for row in rows[:limit]]
+    for item in items:
+        for column in HIGHLIGHT_COLUMNS:
+            item[column] = render_highlight(item[column])
+    next_offset = offset + limit if has_more and offset + limit <= MAX_SEARCH_OFFSET else None
+    return {"items": items, "next_offset": next_offset}
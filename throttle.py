@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from metrics import register_metrics
+
+LOGIN_WINDOW_SECONDS = 15 * 60
+LOGIN_MAX_FAILURES_PER_USERNAME = 5
+# Keyed on request.client.host. Behind a reverse proxy that is the proxy's
+# address for everyone, so the proxy must set X-Forwarded-For and uvicorn must
+# trust it (--proxy-headers --forwarded-allow-ips=<proxy address>); otherwise
+# 20 failures from anyone lock out every user.
+LOGIN_MAX_FAILURES_PER_IP = 20
+# First lockout length; each further lockout of the same key doubles it
+LOCKOUT_BASE_SECONDS = 30
+LOCKOUT_MAX_SECONDS = 60 * 60
+# Keys tracked per throttle before the least recently seen are dropped
+THROTTLE_MAX_KEYS = 100_000
+
+
+class SlidingWindowThrottle:
+    """Counts failures per key over a sliding window and locks the key out exponentially"""
+
+    def __init__(self, max_failures: int, window: float = LOGIN_WINDOW_SECONDS, max_keys: int = THROTTLE_MAX_KEYS):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [failure timestamps, locked until, consecutive lockouts]
+        self._state: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.lockouts = 0
+
+    def retry_after(self, key: str) -> Optional[int]:
+        """Seconds until key may try again, or None if it is not locked out"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or state[1] <= now:
+                return None
+            self.throttled += 1
+            return int(state[1] - now) + 1
+
+    def record_failure(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = [deque(), 0.0, 0]
+            self._state.move_to_end(key)
+            failures = state[0]
+            failures.append(now)
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if len(failures) >= self.max_failures:
+                state[1] = now + min(LOCKOUT_BASE_SECONDS * 2 ** state[2], LOCKOUT_MAX_SECONDS)
+                state[2] += 1
+                failures.clear()
+                self.lockouts += 1
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._state.pop(key, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "tracked_keys": len(self._state),
+                "locked_out": sum(1 for state in self._state.values() if state[1] > now),
+                "lockouts": self.lockouts,
+                "throttled": self.throttled,
+            }
+
+
+class LoginThrottle:
+    """Per-username and per-IP login throttles, checked before any password hashing"""
+
+    def __init__(self):
+        self.by_username = SlidingWindowThrottle(LOGIN_MAX_FAILURES_PER_USERNAME)
+        self.by_ip = SlidingWindowThrottle(LOGIN_MAX_FAILURES_PER_IP)
+
+    def retry_after(self, username: str, ip: str) -> Optional[int]:
+        waits = [wait for wait in (self.by_username.retry_after(username), self.by_ip.retry_after(ip)) if wait]
+        return max(waits) if waits else None
+
+    def record_failure(self, username: str, ip: str):
+        self.by_username.record_failure(username)
+        self.by_ip.record_failure(ip)
+
+    def record_success(self, username: str):
+        # The IP keeps its history; one good password should not clear a spray from it
+        self.by_username.reset(username)
+
+    def stats(self) -> dict:
+        return {"username": self.by_username.stats(), "ip": self.by_ip.stats()}
+
+
+login_throttle = LoginThrottle()
+register_metrics("login_throttle", login_throttle.stats)
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from database import AsyncSessionLocal
+from metrics import register_metrics
+from models import News, ScheduledRun, StoredImage
+from upload_storage import IMAGE_EXTENSIONS, UPLOAD_DIR, VARIANT_NAME
+
+# Files are only deleted once unreferenced and untouched for this long, so an
+# upload that is still being committed never loses its file
+UPLOAD_GC_GRACE = timedelta(hours=float(os.getenv("UPLOAD_GC_GRACE_HOURS", "24")))
+# How often the collector runs in the background (0 disables it). Every worker
+# wakes up on this schedule, but only the first to claim the run does the scan.
+UPLOAD_GC_INTERVAL_SECONDS = float(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", str(6 * 3600)))
+# Files examined per database round trip, and the pause between batches
+UPLOAD_GC_BATCH_SIZE = 200
+UPLOAD_GC_BATCH_PAUSE_SECONDS = 0.05
+
+SOURCE_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(?P<ext>\.[a-z]+)$")
+TEMP_PREFIXES = (".upload-", ".variant-")
+
+# (path, name, size, mtime)
+Entry = Tuple[str, str, int, float]
+
+
+def _entries(directory: str) -> Iterator[Entry]:
+    """Every file under the upload directory: legacy files at the top, hashed ones in shards"""
+    try:
+        top = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in top:
+        if entry.is_dir(follow_symlinks=False):
+            with os.scandir(entry.path) as shard:
+                for child in sorted(shard, key=lambda child: child.name):
+                    if child.is_file(follow_symlinks=False):
+                        stat = child.stat(follow_symlinks=False)
+                        yield child.path, child.name, stat.st_size, stat.st_mtime
+        elif entry.is_file(follow_symlinks=False):
+            stat = entry.stat(follow_symlinks=False)
+            yield entry.path, entry.name, stat.st_size, stat.st_mtime
+
+
+def _batches(directory: str, size: int) -> Iterator[List[Entry]]:
+    batch = []
+    for entry in _entries(directory):
+        batch.append(entry)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _digest_of(name: str) -> Optional[str]:
+    match = SOURCE_NAME.match(name) or VARIANT_NAME.match(name)
+    return match["digest"] if match else None
+
+
+def _source_mtime(directory: str, digest: str) -> Optional[float]:
+    for ext in IMAGE_EXTENSIONS.values():
+        try:
+            return os.stat(os.path.join(directory, digest[:2], f"{digest}{ext}")).st_mtime
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _remove(paths: List[Tuple[str, int]]) -> Tuple[int, int]:
+    """Delete files, returning (files, bytes) actually removed"""
+    files = reclaimed = 0
+    for path, size in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        files += 1
+        reclaimed += size
+    return files, reclaimed
+
+
+class UploadCollector:
+    """Deletes upload files that no article references
+
+    Walks uploads/ in batches. A content-addressed image and its variants go
+    together once its stored_images row has been at zero references for the
+    grace period and its source file has not been touched by a re-upload in
+    that time; an image with no row at all only needs the file to be that old.
+    Legacy top-level files have no row, so for them the database is asked which
+    URLs a News row still uses. Each batch is one short read and one short
+    delete, so uploads are never blocked for long.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, grace: timedelta = UPLOAD_GC_GRACE):
+        self.directory = directory
+        self.grace = grace
+        self.runs = 0
+        self.files_deleted = 0
+        self.bytes_reclaimed = 0
+        self.last_run: Optional[dict] = None
+
+    async def _collect_batch(self, batch: List[Entry], cutoff: datetime, dry_run: bool) -> Tuple[int, int]:
+        cutoff_ts = (cutoff - datetime(1970, 1, 1)).total_seconds()
+        digests: Dict[str, List[Entry]] = {}
+        legacy: Dict[str, Entry] = {}
+        doomed: List[Tuple[str, int]] = []
+        for entry in batch:
+            path, name, size, mtime = entry
+            if name.startswith(TEMP_PREFIXES) and name.endswith(".part"):
+                # Left behind by an upload or variant job that died part-way
+                if mtime < cutoff_ts:
+                    doomed.append((path, size))
+            elif name.startswith("."):
+                continue
+            elif os.path.dirname(path) == self.directory:
+                legacy[f"/{self.directory}/{name}"] = entry
+            elif (digest := _digest_of(name)) is not None:
+                digests.setdefault(digest, []).append(entry)
+
+        async with AsyncSessionLocal() as db:
+            referenced = set((await db.execute(
+                select(News.image_url).where(News.image_url.in_(list(legacy)))
+            )).scalars()) if legacy else set()
+            # digest -> whether the image is still referenced or was released too recently
+            held = dict((await db.execute(
+                select(StoredImage.digest, or_(StoredImage.ref_count > 0, StoredImage.updated_at >= cutoff))
+                .where(StoredImage.digest.in_(list(digests)))
+            )).all()) if digests else {}
+
+        for url, (path, name, size, mtime) in legacy.items():
+            if url not in referenced and mtime < cutoff_ts:
+                doomed.append((path, size))
+        released: Dict[str, List[Entry]] = {}
+        for digest, entries in digests.items():
+            if held.get(digest):
+                continue
+            # An upload whose reference is not committed yet has just written or touched the source
+            source_mtime = await asyncio.to_thread(_source_mtime, self.directory, digest)
+            if source_mtime is not None and source_mtime >= cutoff_ts:
+                continue
+            if digest in held:
+                released[digest] = entries
+            else:
+                doomed.extend((path, size) for path, name, size, mtime in entries)
+
+        if dry_run:
+            doomed.extend((path, size) for entries in released.values() for path, name, size, mtime in entries)
+            return len(doomed), sum(size for path, size in doomed)
+        files = reclaimed = 0
+        if released:
+            async with AsyncSessionLocal() as db:
+                # Only rows still unreferenced are deleted, and their files go
+                # before the commit: an upload re-referencing the image waits on
+                # the row and then finds the file missing, so it writes it again
+                deleted = set((await db.execute(
+                    delete(StoredImage)
+                    .where(
+                        StoredImage.digest.in_(list(released)),
+                        StoredImage.ref_count == 0,
+                        StoredImage.updated_at < cutoff,
+                    )
+                    .returning(StoredImage.digest)
+                )).scalars())
+                files, reclaimed = await asyncio.to_thread(_remove, [
+                    (path, size) for digest in deleted for path, name, size, mtime in released[digest]
+                ])
+                await db.commit()
+        removed, freed = await asyncio.to_thread(_remove, doomed)
+        return files + removed, reclaimed + freed
+
+    async def collect(self, dry_run: bool = False) -> dict:
+        """One pass over the upload directory; returns what was (or would be) deleted"""
+        started = time.monotonic()
+        cutoff = datetime.utcnow() - self.grace
+        batches = _batches(self.directory, UPLOAD_GC_BATCH_SIZE)
+        scanned = files = reclaimed = 0
+        while True:
+            # Directory listing and stat calls stay off the event loop
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            scanned += len(batch)
+            deleted, freed = await self._collect_batch(batch, cutoff, dry_run)
+            files += deleted
+            reclaimed += freed
+            await asyncio.sleep(UPLOAD_GC_BATCH_PAUSE_SECONDS)
+
+        result = {
+            "dry_run": dry_run,
+            "files_scanned": scanned,
+            "files_deleted": files,
+            "bytes_reclaimed": reclaimed,
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        if not dry_run:
+            self.runs += 1
+            self.files_deleted += files
+            self.bytes_reclaimed += reclaimed
+            self.last_run = result
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "grace_hours": self.grace.total_seconds() / 3600,
+            "runs": self.runs,
+            "files_deleted": self.files_deleted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_run": self.last_run,
+        }
+
+
+upload_collector = UploadCollector()
+register_metrics("upload_gc", upload_collector.stats)
+
+
+async def claim_scheduled_run(name: str, interval: float) -> bool:
+    """Record that this process starts job name now, unless another did within the interval"""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+        await db.execute(
+            dialect.insert(ScheduledRun)
+            .values(name=name, started_at=datetime(1970, 1, 1))
+            .on_conflict_do_nothing(index_elements=[ScheduledRun.name])
+        )
+        # Half an interval of slack: workers started together wake up together
+        result = await db.execute(
+            update(ScheduledRun)
+            .where(ScheduledRun.name == name, ScheduledRun.started_at < now - timedelta(seconds=interval / 2))
+            .values(started_at=now)
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+async def collect_uploads_periodically(interval: float = UPLOAD_GC_INTERVAL_SECONDS):
+    """Background task running the collector every interval seconds in one worker"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await claim_scheduled_run("upload_gc", interval):
+                continue
+            result = await upload_collector.collect()
+            if result["files_deleted"]:
+                print(f"🧹 Upload GC deleted {result['files_deleted']} files, {result['bytes_reclaimed']} bytes")
+        except Exception as exc:
+            print(f"⚠️  Upload GC failed: {exc}")
+
+
+if __name__ == "__main__":
+    # python upload_gc.py [--dry-run]
+    if sys.argv[1:] not in ([], ["--dry-run"]):
+        sys.exit("usage: python upload_gc.py [--dry-run]")
+    outcome = asyncio.run(upload_collector.collect(dry_run=sys.argv[1:] == ["--dry-run"]))
+    verb = "Would delete" if outcome["dry_run"] else "Deleted"
+    print(f"{verb} {outcome['files_deleted']} of {outcome['files_scanned']} files, {outcome['bytes_reclaimed']} bytes")
@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from metrics import register_metrics
+from models import StoredImage
+
+UPLOAD_DIR = "uploads"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Whole request bodies on the upload routes: the image plus the other form fields
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + 1024 * 1024
+UPLOAD_ROUTE_PREFIX = "/news"
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_IO_WORKERS = 4
+# Content-addressed images never change, so clients and CDNs may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Images stored under their upload filename (before content addressing) were overwritable
+LEGACY_CACHE_CONTROL = "public, max-age=3600"
+# Set to an nginx `internal` location (e.g. /_uploads/) to have nginx send the file
+# with sendfile(2) instead of the worker. nginx drops the ETag and Vary headers of
+# such responses, so that location must add them back from $upstream_http_etag and
+# $upstream_http_vary; see docker-compose.postgres.yml
+UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT")
+
+# content type -> leading bytes every file of that type starts with
+ALLOWED_IMAGE_TYPES = {
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/gif": (b"GIF87a", b"GIF89a"),
+    "image/webp": (b"RIFF",),
+}
+IMAGE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+# Resized variants (image_variants.py) sit next to their source: ab/abcdef…-640w.jpg.
+# A request for one may be answered with a better format the client accepts, best first.
+VARIANT_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})-(?P<width>\d+)w(?P<ext>\.[a-z]+)$")
+NEGOTIATED_FORMATS = (("image/avif", ".avif"), ("image/webp", ".webp"))
+
+
+def image_path(digest: str, content_type: str) -> str:
+    """Location of an image under the upload directory: ab/abcdef….png"""
+    return f"{digest[:2]}/{digest}{IMAGE_EXTENSIONS[content_type]}"
+
+
+def variant_path(directory: str, digest: str, width: int, ext: str) -> str:
+    return os.path.join(directory, digest[:2], f"{digest}-{width}w{ext}")
+
+
+def negotiate_variant(full_path: str, accept: str) -> Optional[str]:
+    """Path of a better format of the variant at full_path that the client accepts, if any"""
+    match = VARIANT_NAME.match(os.path.basename(full_path))
+    if match is None:
+        return None
+    accepted = {item.split(";")[0].strip().lower() for item in accept.split(",")}
+    for mime, ext in NEGOTIATED_FORMATS:
+        if mime in accepted and ext != match["ext"]:
+            path = os.path.join(os.path.dirname(full_path), f"{match['digest']}-{match['width']}w{ext}")
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def digest_from_url(url: Optional[str]) -> Optional[str]:
+    """SHA-256 of a content-addressed image URL, or None for any other URL"""
+    if not url or not url.startswith(f"/{UPLOAD_DIR}/"):
+        return None
+    name = os.path.splitext(os.path.basename(url))[0]
+    return name if len(name) == 64 else None
+
+
+def _sniff_matches(content_type: str, head: bytes) -> bool:
+    if content_type == "image/webp" and head[8:12] != b"WEBP":
+        return False
+    return any(head.startswith(magic) for magic in ALLOWED_IMAGE_TYPES[content_type])
+
+
+class UploadPipeline:
+    """Stores uploaded images once, named by the SHA-256 of their content
+
+    The upload is read in fixed-size chunks twice: once to validate and hash
+    it, and, only when no file with that hash exists yet, again to stream it
+    to a temporary file that is renamed into place. Memory per upload is one
+    chunk whatever the file size, and duplicates never touch the disk.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=UPLOAD_IO_WORKERS, thread_name_prefix="upload-io")
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.bytes_stored = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+    async def _io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def count_rejection(self):
+        with self._lock:
+            self.rejected += 1
+
+    def _reject(self, status_code: int, detail: str):
+        self.count_rejection()
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    async def _scan(self, upload: UploadFile, content_type: str) -> Tuple[str, int]:
+        """Validate type and size while hashing; returns (hex digest, size)"""
+        hasher = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            if size == 0 and not _sniff_matches(content_type, chunk):
+                self._reject(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, f"File is not a valid {content_type} image")
+            size += len(chunk)
+            if size > self.max_bytes:
+                self._reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Image is larger than {self.max_bytes} bytes")
+            # hashlib releases the GIL for large buffers
+            await self._io(hasher.update, chunk)
+        if size == 0:
+            self._reject(status.HTTP_400_BAD_REQUEST, "Image is empty")
+        return hasher.hexdigest(), size
+
+    async def _write(self, upload: UploadFile, path: str):
+        """Stream the upload to path through a temporary file in the same directory"""
+        directory = os.path.dirname(path)
+        await self._io(os.makedirs, directory, 0o755, True)
+        fd, temp_path = await self._io(tempfile.mkstemp, ".part", ".upload-", directory)
+        temp = os.fdopen(fd, "wb")
+        try:
+            await upload.seek(0)
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await self._io(temp.write, chunk)
+            await self._io(temp.close)
+            await self._io(os.chmod, temp_path, 0o644)
+            # Readers see either no file or the complete one
+            await self._io(os.replace, temp_path, path)
+        except BaseException:
+            await self._io(temp.close)
+            await self._io(_remove_quietly, temp_path)
+            raise
+
+    async def save(self, upload: UploadFile, db: AsyncSession) -> str:
+        """Store an uploaded image, add a reference to it in db's transaction, and return its URL"""
+        content_type = (upload.content_type or "").split(";")[0].strip().lower()
+        if content_type not in ALLOWED_IMAGE_TYPES:
+            self._reject(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, f"Unsupported image type: {content_type or 'unknown'}")
+
+        try:
+            digest, size = await self._scan(upload, content_type)
+            relative = image_path(digest, content_type)
+            path = os.path.join(self.directory, relative)
+            # Reference first: the upsert waits for a collector deleting this row,
+            # whose files are gone by the time it commits, and the check below
+            # then writes the file again
+            await acquire_image(db, digest, relative, content_type, size)
+            if await self._io(_touch_if_exists, path):
+                with self._lock:
+                    self.deduplicated += 1
+            else:
+                await self._write(upload, path)
+                with self._lock:
+                    self.stored += 1
+                    self.bytes_stored += size
+        finally:
+            await upload.close()
+
+        return f"/{self.directory}/{relative}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "stored": self.stored,
+                "bytes_stored": self.bytes_stored,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "max_bytes": self.max_bytes,
+            }
+
+
+async def acquire_image(db: AsyncSession, digest: str, path: str, content_type: str, size: int):
+    """Add a reference to an image, creating its row on first use (committed with db)"""
+    dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+    now = datetime.utcnow()
+    statement = dialect.insert(StoredImage).values(
+        digest=digest, path=path, content_type=content_type, size=size,
+        ref_count=1, created_at=now, updated_at=now,
+    )
+    # An atomic upsert, so concurrent uploads of the same image both count
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[StoredImage.digest],
+        set_={"ref_count": StoredImage.ref_count + 1, "updated_at": now},
+    ))
+
+
+async def release_image(db: AsyncSession, url: Optional[str]):
+    """Drop a reference to the image at url, if it is content-addressed (committed with db)
+
+    The file stays on disk at zero references until garbage collection, so an
+    upload of the same image in the meantime can reuse it.
+    """
+    digest = digest_from_url(url)
+    if digest is None:
+        return
+    await db.execute(
+        update(StoredImage)
+        .where(StoredImage.digest == digest, StoredImage.ref_count > 0)
+        .values(ref_count=StoredImage.ref_count - 1, updated_at=datetime.utcnow())
+    )
+
+
+class UploadFiles(StaticFiles):
+    """Serves /uploads with cache headers suited to content-addressed files
+
+    Content-addressed images and their variants get a year-long immutable
+    Cache-Control and a strong ETag derived from their name. Variant requests
+    are answered in the best format the Accept header allows. Starlette's
+    FileResponse answers Range and If-Range and uses zero-copy
+    `http.response.pathsend` when the server offers it; behind nginx,
+    UPLOADS_ACCEL_REDIRECT hands the file to nginx instead.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        # Temporary .upload-*.part files and other hidden files are not served
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        filename = os.path.basename(full_path)
+        headers = {}
+        if VARIANT_NAME.match(filename):
+            headers["Vary"] = "Accept"
+            negotiated = negotiate_variant(str(full_path), request_headers.get("accept", ""))
+            if negotiated is not None:
+                full_path, stat_result = negotiated, os.stat(negotiated)
+                filename = os.path.basename(negotiated)
+            headers["ETag"] = f'"{filename}"'
+        elif digest_from_url(f"/{UPLOAD_DIR}/{filename}"):
+            headers["ETag"] = f'"{os.path.splitext(filename)[0]}"'
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if "ETag" in headers else LEGACY_CACHE_CONTROL
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if UPLOADS_ACCEL_REDIRECT:
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            accel_headers = {
+                name: value for name, value in response.headers.items()
+                if name in ("cache-control", "etag", "last-modified", "content-type", "vary")
+            }
+            accel_headers["X-Accel-Redirect"] = UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + relative
+            return Response(status_code=status_code, headers=accel_headers)
+        return response
+
+
+def _touch_if_exists(path: str) -> bool:
+    """Mark an existing file as just used, so garbage collection leaves it alone"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class UploadSizeLimit:
+    """ASGI middleware capping request bodies on the upload routes
+
+    Starlette parses the whole multipart body into a temporary file before
+    the handler runs, so the handler's size check comes too late to spare the
+    disk. This rejects an oversized Content-Length up front and stops reading
+    a body (chunked or under-declared) once it passes the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_REQUEST_BYTES, prefix: str = UPLOAD_ROUTE_PREFIX):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT", "PATCH")
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        too_large = HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body is larger than {self.max_bytes} bytes",
+        )
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            upload_pipeline.count_rejection()
+            response = JSONResponse({"detail": too_large.detail}, status_code=too_large.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    upload_pipeline.count_rejection()
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the response
+                    raise too_large
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+upload_pipeline = UploadPipeline()
+register_metrics("uploads", upload_pipeline.stats)
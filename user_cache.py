@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from invalidation import publish_invalidation, register_invalidation_handler
+from metrics import register_metrics
+from models import User
+
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_ENTRIES = 1024
+
+
+def user_key(username: str) -> str:
+    return f"user:{username}"
+
+
+class UserCache:
+    """TTL + LRU cache of user rows, stored as detached snapshots"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str) -> Optional[User]:
+        """Return a detached copy of the cached user, or None"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return _snapshot(entry[1])
+
+    def set(self, username: str, user: User):
+        with self._lock:
+            self._entries[username] = (time.monotonic() + self.ttl, _column_values(user))
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+def _column_values(user: User) -> dict:
+    return {column.name: getattr(user, column.name) for column in User.__table__.columns}
+
+
+def _snapshot(values: dict) -> User:
+    """Rebuild a detached User that Session.merge(load=False) can attach without a query"""
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+class TokenVersions:
+    """Last known token_version per user, kept until an invalidation evicts it"""
+
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES * 10):
+        self.max_entries = max_entries
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[int]:
+        with self._lock:
+            version = self._versions.get(username)
+            if version is not None:
+                self._versions.move_to_end(username)
+            return version
+
+    def set(self, username: str, version: int):
+        with self._lock:
+            self._versions[username] = version
+            self._versions.move_to_end(username)
+            while len(self._versions) > self.max_entries:
+                self._versions.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._versions.pop(username, None)
+
+
+user_cache = UserCache()
+token_versions = TokenVersions()
+register_metrics("user_cache", user_cache.stats)
+
+
+def evict_user(username: str):
+    user_cache.invalidate(username)
+    token_versions.invalidate(username)
+
+
+register_invalidation_handler("user", evict_user)
+
+
+async def invalidate_user(db: AsyncSession, username: str):
+    """Evict a user here and publish the eviction to other worker processes"""
+    evict_user(username)
+    publish_invalidation(db, user_key(username))
+    await db.commit()